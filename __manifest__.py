@@ -1,6 +1,6 @@
 {
     'name': 'Marble Serial Tracking',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.2.0',
     'category': 'Inventory',
     'summary': 'Track Marble Pieces with Dimensions and Unique Serials',
     'author': 'ALPHAQUEB CONSULTING',
@@ -9,6 +9,7 @@
     'maintainer': 'ANTONIO QUEB',
     'depends': ['purchase', 'stock',  'sale_management', 'sale_stock', 'marble_pedimento_tracking', 'marble_product_base'],
     'data': [
+        'security/ir.model.access.csv',
         'data/ir_sequence_data.xml',
         'views/purchase_order_views.xml',
         'views/stock_move_line_views.xml',
@@ -16,6 +17,15 @@
         'views/stock_picking_views.xml',
         'views/sale_order_views.xml',
         'views/product_template_views.xml',  
+        'views/marble_block_views.xml',
+        'views/marble_perf_stat_views.xml',
+        'views/marble_stock_summary_views.xml',
+        'data/marble_stock_summary_data.xml',
+        'views/marble_slab_search_views.xml',
+        'views/marble_packing_list_import_views.xml',
+        'views/marble_container_receipt_views.xml',
+        'views/marble_price_level_views.xml',
+        'data/ir_cron_data.xml',
     ],
     'installable': True,
     'application': False,
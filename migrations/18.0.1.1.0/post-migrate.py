@@ -0,0 +1,19 @@
+# Los contadores de serie pasan de una ir.sequence por lot_general
+# (marble.serial.<lot_general>) al modelo marble.block.
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    prefix = 'marble.serial.'
+    sequences = env['ir.sequence'].search([('code', '=like', f'{prefix}%')])
+    if not sequences:
+        return
+    existing = set(env['marble.block'].search([]).mapped('name'))
+    env['marble.block'].create([{
+        'name': sequence.code[len(prefix):],
+        'serial_next': sequence.number_next_actual,
+        'serial_padding': sequence.padding,
+    } for sequence in sequences if sequence.code[len(prefix):] not in existing])
+    sequences.unlink()
@@ -0,0 +1,8 @@
+# Primera carga del resumen de existencias en m² (marble.stock.summary).
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['marble.stock.summary']._rebuild()
@@ -1,3 +1,4 @@
+from . import marble_perf_stat
 from . import purchase_order_line
 from . import stock_move_line
 from . import stock_quant
@@ -9,4 +10,8 @@ from . import stock_rule
 from . import product_template
 from . import sale_order
 from . import procurement_group
-from . import stock_picking
\ No newline at end of file
+from . import stock_picking
+from . import marble_block
+from . import marble_stock_summary
+from . import marble_query_plan
+from . import marble_slab_allocator
@@ -0,0 +1,110 @@
+# models/marble_block.py
+
+from psycopg2.errors import LockNotAvailable
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+# Espera máxima del cursor propio por la fila del bloque antes de reservar en
+# el cursor de la petición (la fila puede estar bloqueada por esta misma transacción)
+SERIAL_LOCK_TIMEOUT = '2s'
+
+
+class MarbleBlock(models.Model):
+    _name = 'marble.block'
+    _description = 'Bloque de Mármol'
+    _order = 'name'
+
+    name = fields.Char('Lote', required=True, readonly=True)
+    serial_next = fields.Integer('Siguiente Número de Serie', default=1, required=True)
+    serial_padding = fields.Integer('Dígitos de la Serie', default=3, required=True)
+    lot_count = fields.Integer('Piezas', compute='_compute_lot_count')
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'Ya existe un bloque con ese lote.'),
+    ]
+
+    def _compute_lot_count(self):
+        counts = dict(self.env['stock.lot']._read_group(
+            [('lot_general', 'in', self.mapped('name'))],
+            groupby=['lot_general'],
+            aggregates=['__count'],
+        ))
+        for block in self:
+            block.lot_count = counts.get(block.name, 0)
+
+    def action_view_lots(self):
+        self.ensure_one()
+        action = self.env['ir.actions.act_window']._for_xml_id('stock.action_production_lot_form')
+        action['domain'] = [('lot_general', '=', self.name)]
+        action['context'] = {}
+        return action
+
+    @api.model
+    def _allocate_serials(self, counts):
+        """
+        Reserva números de serie para varios bloques a la vez.
+
+        :param counts: {lot_general: cantidad de series a reservar}
+        :return: {lot_general: [nombres de serie]}
+
+        Los bloques que no existen se crean y el contador de cada uno avanza N
+        en un único INSERT ... ON CONFLICT DO UPDATE ... RETURNING. La sentencia
+        se ejecuta en un cursor propio en READ COMMITTED que se confirma al
+        instante, como nextval() en una secuencia: dos workers que reciben el
+        mismo bloque se esperan unos milisegundos sobre la fila del bloque, sin
+        duplicar bloques ni provocar errores de serialización en la transacción
+        principal. Si esta se revierte, los números reservados se pierden.
+
+        Si la fila del bloque sigue bloqueada pasado SERIAL_LOCK_TIMEOUT (la
+        propia transacción de la petición escribió el bloque), la reserva se
+        hace en self.env.cr y queda ligada a la transacción principal.
+        """
+        counts = {name: count for name, count in counts.items() if count > 0}
+        if not counts:
+            return {}
+        # Los cambios pendientes sobre los bloques deben estar en la base antes
+        # del upsert, para que un flush posterior no pise los contadores
+        self.flush_model()
+        try:
+            with self.env.registry.cursor() as cr:
+                if not self.env.registry.in_test_mode():
+                    cr.execute(SQL("SET TRANSACTION ISOLATION LEVEL READ COMMITTED"))
+                    cr.execute(SQL("SET LOCAL lock_timeout = %s", SERIAL_LOCK_TIMEOUT))
+                rows = self._marble_reserve_serials(cr, counts)
+        except LockNotAvailable:
+            # La transacción de la petición ya tiene bloqueada la fila del
+            # bloque (p. ej. lo modificó antes): el cursor propio esperaría
+            # para siempre, así que se reserva en el cursor de la petición.
+            rows = self._marble_reserve_serials(self.env.cr, counts)
+
+        self.invalidate_model(['serial_next', 'write_uid', 'write_date'])
+        serials = {}
+        for name, serial_next, padding in rows:
+            start = serial_next - counts[name]
+            serials[name] = [f"{name}-{number:0{padding}d}" for number in range(start, serial_next)]
+        return serials
+
+    @api.model
+    def _marble_reserve_serials(self, cr, counts):
+        """Ejecuta en `cr` el upsert que avanza los contadores; devuelve [(name, serial_next, padding)]."""
+        names = sorted(counts)
+        cr.execute(SQL(
+            """
+            INSERT INTO marble_block AS block
+                   (name, serial_next, serial_padding, create_uid, create_date, write_uid, write_date)
+            SELECT request.name, request.count + 1, 3,
+                   %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM unnest(%(names)s::varchar[], %(counts)s::int[]) AS request(name, count)
+          ORDER BY request.name
+                ON CONFLICT (name) DO UPDATE
+               SET serial_next = block.serial_next + EXCLUDED.serial_next - 1,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+         RETURNING block.name, block.serial_next, block.serial_padding
+            """,
+            uid=self.env.uid,
+            names=names,
+            counts=[counts[name] for name in names],
+        ))
+        return cr.fetchall()
@@ -0,0 +1,158 @@
+# models/marble_perf_stat.py
+
+import functools
+import json
+import time
+
+from odoo import models, fields, api
+from odoo.tools import SQL, str2bool
+
+# Activación: parámetro del sistema o clave de contexto (el contexto manda).
+INSTRUMENTATION_PARAM = 'marble_serial_tracking.instrumentation'
+INSTRUMENTATION_CONTEXT_KEY = 'marble_instrumentation'
+# Estadísticas pendientes de la transacción: {clave: [llamadas, registros, tiempo, tiempo_max, consultas]}
+PENDING_STATS_KEY = 'marble.perf_stats'
+
+
+def instrumentation_enabled(env):
+    if INSTRUMENTATION_CONTEXT_KEY in env.context:
+        return bool(env.context[INSTRUMENTATION_CONTEXT_KEY])
+    return str2bool(env['ir.config_parameter'].sudo().get_param(INSTRUMENTATION_PARAM, 'False'))
+
+
+def instrument(key):
+    """
+    Decorador para los overrides del módulo: cuando la instrumentación está
+    activa acumula llamadas, registros, tiempo y número de consultas SQL bajo
+    `key`; cuando no, solo cuesta la lectura (cacheada) del parámetro.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not instrumentation_enabled(self.env):
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            queries = cr.sql_log_count
+            start = time.perf_counter()
+            result = method(self, *args, **kwargs)
+            records = len(result) if isinstance(result, models.BaseModel) else len(self)
+            self.env['marble.perf.stat']._record_call(
+                key, records, time.perf_counter() - start, cr.sql_log_count - queries,
+            )
+            return result
+        return wrapper
+    return decorate
+
+
+class MarblePerfStat(models.Model):
+    _name = 'marble.perf.stat'
+    _description = 'Instrumentación de Mármol'
+    _order = 'total_time desc'
+
+    name = fields.Char('Operación', required=True, readonly=True)
+    call_count = fields.Integer('Llamadas', readonly=True)
+    record_count = fields.Integer('Registros', readonly=True)
+    total_time = fields.Float('Tiempo Total (s)', digits=(16, 4), readonly=True)
+    max_time = fields.Float('Tiempo Máximo (s)', digits=(16, 4), readonly=True)
+    avg_time = fields.Float('Tiempo Medio (s)', digits=(16, 4), compute='_compute_averages')
+    query_count = fields.Integer('Consultas SQL', readonly=True)
+    avg_query_count = fields.Float('Consultas por Llamada', digits=(16, 1), compute='_compute_averages')
+    last_call = fields.Datetime('Última Llamada', readonly=True)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'La operación ya tiene estadísticas.'),
+    ]
+
+    @api.depends('call_count', 'total_time', 'query_count')
+    def _compute_averages(self):
+        for stat in self:
+            calls = stat.call_count or 1
+            stat.avg_time = stat.total_time / calls
+            stat.avg_query_count = stat.query_count / calls
+
+    @api.model
+    def _record_call(self, key, records, elapsed, queries):
+        """Acumula la llamada en memoria; se vuelca una vez confirmada la transacción."""
+        pending = self.env.cr.postcommit.data.setdefault(PENDING_STATS_KEY, {})
+        if not pending:
+            self.env.cr.postcommit.add(functools.partial(self._flush_stats, pending))
+        stat = pending.setdefault(key, [0, 0, 0.0, 0.0, 0])
+        stat[0] += 1
+        stat[1] += records
+        stat[2] += elapsed
+        stat[3] = max(stat[3], elapsed)
+        stat[4] += queries
+
+    @api.model
+    def _flush_stats(self, pending):
+        """
+        Vuelca las estadísticas en un cursor propio, en READ COMMITTED, para
+        que la instrumentación nunca bloquee ni provoque reintentos de la
+        transacción medida.
+        """
+        if not pending:
+            return
+        keys = sorted(pending)
+        with self.env.registry.cursor() as cr:
+            if not self.env.registry.in_test_mode():
+                cr.execute(SQL("SET TRANSACTION ISOLATION LEVEL READ COMMITTED"))
+            cr.execute(SQL(
+                """
+                INSERT INTO marble_perf_stat AS stat
+                       (name, call_count, record_count, total_time, max_time, query_count, last_call,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT call.name, call.calls, call.records, call.elapsed, call.max_elapsed, call.queries,
+                       now() AT TIME ZONE 'UTC',
+                       %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+                  FROM unnest(%(names)s::varchar[], %(calls)s::int[], %(records)s::int[],
+                              %(elapsed)s::float8[], %(max_elapsed)s::float8[], %(queries)s::int[])
+                       AS call(name, calls, records, elapsed, max_elapsed, queries)
+              ORDER BY call.name
+                    ON CONFLICT (name) DO UPDATE
+                   SET call_count = stat.call_count + EXCLUDED.call_count,
+                       record_count = stat.record_count + EXCLUDED.record_count,
+                       total_time = stat.total_time + EXCLUDED.total_time,
+                       max_time = GREATEST(stat.max_time, EXCLUDED.max_time),
+                       query_count = stat.query_count + EXCLUDED.query_count,
+                       last_call = EXCLUDED.last_call,
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+                """,
+                uid=self.env.uid,
+                names=keys,
+                calls=[pending[key][0] for key in keys],
+                records=[pending[key][1] for key in keys],
+                elapsed=[pending[key][2] for key in keys],
+                max_elapsed=[pending[key][3] for key in keys],
+                queries=[pending[key][4] for key in keys],
+            ))
+        pending.clear()
+
+    def _export_json(self):
+        return json.dumps([{
+            'operation': stat.name,
+            'calls': stat.call_count,
+            'records': stat.record_count,
+            'total_time': stat.total_time,
+            'max_time': stat.max_time,
+            'avg_time': stat.avg_time,
+            'queries': stat.query_count,
+            'avg_queries': stat.avg_query_count,
+            'last_call': fields.Datetime.to_string(stat.last_call),
+        } for stat in self], indent=2)
+
+    def action_export_json(self):
+        stats = self or self.search([])
+        attachment = self.env['ir.attachment'].create({
+            'name': 'marble_instrumentation.json',
+            'raw': stats._export_json().encode(),
+            'mimetype': 'application/json',
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
+
+    def action_reset(self):
+        (self or self.search([])).unlink()
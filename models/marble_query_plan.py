@@ -0,0 +1,114 @@
+# models/marble_query_plan.py
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+# Tablas grandes en las que un recorrido sin condición de índice delata un índice ausente
+WATCHED_TABLES = frozenset({
+    'stock_quant', 'stock_lot', 'stock_move', 'stock_move_line', 'marble_stock_summary',
+})
+
+
+class MarbleQueryPlan(models.AbstractModel):
+    _name = 'marble.query.plan'
+    _description = 'Verificación de Planes de Consulta de Mármol'
+
+    @api.model
+    def _get_checked_queries(self):
+        """
+        Accesos principales del módulo: [(etiqueta, modelo, dominio, orden)].
+        Los valores de ejemplo salen de la base si existen; al planificador
+        solo le importa la forma de la consulta.
+        """
+        Lot = self.env['stock.lot']
+        sample_lot = Lot.search([('lot_general', '!=', False)], limit=1)
+        lot_id = sample_lot.id or 1
+        product_id = sample_lot.product_id.id or 1
+        block = sample_lot.lot_general or 'BLOQUE'
+        container = sample_lot.numero_contenedor or 'CONTENEDOR'
+        return [
+            ('Pedimento vigente del lote', 'stock.quant',
+             [('lot_id', '=', lot_id), ('quantity', '>', 0)], 'in_date desc'),
+            ('Lotes disponibles por producto', 'stock.quant',
+             [('product_id', 'in', [product_id]), ('quantity', '>', 0), ('lot_id', '!=', False)], None),
+            ('Quants por bloque', 'stock.quant', [('lot_general', '=', block)], None),
+            ('Quants por contenedor', 'stock.quant', [('numero_contenedor', '=', container)], None),
+            ('Lotes por bloque', 'stock.lot', [('lot_general', '=', block)], None),
+            ('Lotes por contenedor', 'stock.lot', [('numero_contenedor', '=', container)], None),
+            ('Lotes por pedimento', 'stock.lot', [('pedimento_number', '=', 'PEDIMENTO')], None),
+            ('Movimientos por bloque', 'stock.move', [('lot_general', '=', block)], None),
+            ('Movimientos por contenedor', 'stock.move', [('numero_contenedor', '=', container)], None),
+            ('Líneas de movimiento por bloque', 'stock.move.line', [('lot_general', '=', block)], None),
+            ('Líneas de movimiento por contenedor', 'stock.move.line', [('numero_contenedor', '=', container)], None),
+            ('Resumen de m² por producto', 'marble.stock.summary', [('product_id', '=', product_id)], None),
+            ('Placas por medidas', 'stock.lot',
+             Lot._marble_slab_domain(product_id, 2.0, 2.8, 1.6), 'marble_sqm, id'),
+            ('Selector de lotes disponibles', 'stock.lot',
+             [('product_id', '=', product_id),
+              ('quant_ids', 'any', [('quantity', '>', 0), ('location_id.usage', '=', 'internal')])], None),
+        ]
+
+    @api.model
+    def _explain(self, model_name, domain, order=None):
+        """
+        Plan JSON (EXPLAIN) de la consulta que genera el ORM para el dominio.
+        Sin LIMIT ni el orden por defecto (id): con ellos el planificador
+        puede recorrer entero el índice de la clave primaria y aplicar el
+        dominio como simple Filter, ocultando la falta de índice.
+        """
+        query = self.env[model_name]._search(domain, order=order)
+        if not order:
+            query.order = None
+        self.env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", query.select()))
+        return self.env.cr.fetchone()[0][0]['Plan']
+
+    @api.model
+    def _unindexed_scans(self, plan):
+        """
+        Tablas vigiladas que el plan lee sin usar un índice para el dominio:
+        Seq Scan, o recorridos de índice (Index, Index Only, Bitmap) que solo
+        filtran filas (Filter) sin Index Cond ni Recheck Cond.
+        """
+        tables = set()
+        table = plan.get('Relation Name')
+        if table in WATCHED_TABLES:
+            if plan.get('Node Type') == 'Seq Scan':
+                tables.add(table)
+            elif (plan.get('Node Type') in ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+                    and plan.get('Filter')
+                    and not plan.get('Index Cond') and not plan.get('Recheck Cond')):
+                tables.add(table)
+        for subplan in plan.get('Plans', ()):
+            tables |= self._unindexed_scans(subplan)
+        return tables
+
+    @api.model
+    def _find_unindexed_scans(self):
+        """
+        Devuelve [(etiqueta, tablas)] de las consultas que, aunque se
+        desaconseje el Seq Scan al planificador (enable_seqscan = off), no
+        encuentran ningún índice utilizable para su dominio.
+        """
+        self.env.flush_all()
+        offenders = []
+        self.env.cr.execute(SQL("SET LOCAL enable_seqscan = off"))
+        try:
+            for label, model_name, domain, order in self._get_checked_queries():
+                tables = self._unindexed_scans(self._explain(model_name, domain, order))
+                if tables:
+                    offenders.append((label, sorted(tables)))
+        finally:
+            self.env.cr.execute(SQL("RESET enable_seqscan"))
+        return offenders
+
+    @api.model
+    def check_query_plans(self):
+        """Falla si algún acceso principal del módulo no usa un índice."""
+        offenders = self._find_unindexed_scans()
+        if offenders:
+            raise UserError(_(
+                "Consultas sin índice utilizable:\n%s",
+                "\n".join(f"- {label}: {', '.join(tables)}" for label, tables in offenders),
+            ))
+        return True
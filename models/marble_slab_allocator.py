@@ -0,0 +1,145 @@
+# models/marble_slab_allocator.py
+
+from collections import defaultdict
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+
+from .stock_lot import THICKNESS_TOLERANCE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Pesos del costo de asignar una placa a una línea (en m² equivalentes)
+BLOCK_MISMATCH_PENALTY = 5.0  # la línea pide un bloque y la placa es de otro
+BLOCK_SPREAD_PENALTY = 1.0    # la placa viene de un bloque que no alcanza para el pedido
+INFEASIBLE = 1e9
+
+
+def score_candidates(lines, slabs):
+    """
+    Matriz de costos (líneas × placas) del mismo producto.
+
+    :param lines: dict de arrays por línea: long, short, sqm, thickness, block
+    :param slabs: dict de arrays por placa: long, short, sqm, thickness, block
+    :return: np.ndarray de costos; INFEASIBLE donde la placa no sirve
+
+    El costo es el desperdicio de área (m² de la placa menos m² pedidos) más
+    penalizaciones por bloque: distinto al pedido por la línea, o, si la línea
+    no pide bloque, proveniente de un bloque con menos placas que líneas a
+    cubrir (favorece sacar todo el pedido del mismo bloque).
+    """
+    req_long = lines['long'][:, None]
+    req_short = lines['short'][:, None]
+    req_thickness = lines['thickness'][:, None]
+    req_block = lines['block'][:, None]
+
+    fits = (slabs['long'][None, :] >= req_long) & (slabs['short'][None, :] >= req_short)
+    thickness_ok = (req_thickness <= 0) | (np.abs(slabs['thickness'][None, :] - req_thickness) <= THICKNESS_TOLERANCE)
+
+    waste = slabs['sqm'][None, :] - lines['sqm'][:, None]
+
+    block_mismatch = (req_block != '') & (slabs['block'][None, :] != req_block)
+    blocks, block_index, block_sizes = np.unique(slabs['block'], return_inverse=True, return_counts=True)
+    coverage = np.minimum(1.0, block_sizes[block_index] / max(len(lines['sqm']), 1))
+    spread = np.where(req_block == '', (1.0 - coverage)[None, :], 0.0)
+
+    cost = waste + BLOCK_MISMATCH_PENALTY * block_mismatch + BLOCK_SPREAD_PENALTY * spread
+    return np.where(fits & thickness_ok, cost, INFEASIBLE)
+
+
+def solve_assignment(cost):
+    """
+    Asignación línea → placa de costo mínimo (cada placa a lo sumo una vez).
+    Usa el algoritmo húngaro de SciPy si está disponible y, si no, una
+    asignación voraz global sobre los costos ordenados.
+
+    :return: lista de pares (fila, columna) factibles
+    """
+    if not cost.size:
+        return []
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+        return [(r, c) for r, c in zip(rows.tolist(), cols.tolist()) if cost[r, c] < INFEASIBLE]
+
+    n_rows = cost.shape[0]
+    taken_rows, taken_cols, pairs = set(), set(), []
+    for flat in np.argsort(cost, axis=None, kind='stable'):
+        r, c = divmod(int(flat), cost.shape[1])
+        if cost[r, c] >= INFEASIBLE:
+            break
+        if r in taken_rows or c in taken_cols:
+            continue
+        taken_rows.add(r)
+        taken_cols.add(c)
+        pairs.append((r, c))
+        if len(taken_rows) == n_rows:
+            break
+    return pairs
+
+
+class MarbleSlabAllocator(models.AbstractModel):
+    _name = 'marble.slab.allocator'
+    _description = 'Asignación Automática de Placas'
+
+    @api.model
+    def _allocate(self, lines):
+        """
+        Asigna placas con existencias a las líneas de venta sin lote, evitando
+        repetir placas en todo el conjunto.
+
+        :return: {sale.order.line id: stock.lot id}
+        """
+        if np is None:
+            raise UserError(_("La asignación automática de placas requiere la librería Python 'numpy'."))
+
+        lines = lines.filtered(lambda l: not l.display_type and l.product_id and not l.lot_id and l.product_id.tracking != 'none')
+        if not lines:
+            return {}
+
+        lots_by_product = self.env['stock.quant']._marble_available_lots(lines.product_id)
+        candidates = self.env['stock.lot'].union(*lots_by_product.values())
+        # Las placas ya comprometidas en cualquier venta vigente no se ofrecen
+        [[used_lots]] = self.env['sale.order.line']._read_group(
+            [('lot_id', 'in', candidates.ids), ('state', '!=', 'cancel')],
+            aggregates=['lot_id:recordset'],
+        )
+        candidates -= used_lots
+        candidates.fetch([
+            'product_id', 'marble_long_side', 'marble_short_side',
+            'marble_sqm', 'marble_thickness', 'lot_general',
+        ])
+        candidates_by_product = defaultdict(list)
+        for lot in candidates:
+            candidates_by_product[lot.product_id.id].append(lot)
+
+        allocation = {}
+        for product, product_lines in lines.grouped('product_id').items():
+            slabs = candidates_by_product.get(product.id)
+            if not slabs:
+                continue
+            line_data = {
+                'long': np.array([max(l.marble_height, l.marble_width) for l in product_lines], dtype=float),
+                'short': np.array([min(l.marble_height, l.marble_width) for l in product_lines], dtype=float),
+                'sqm': np.array([l.marble_sqm or l.marble_height * l.marble_width for l in product_lines], dtype=float),
+                'thickness': np.array([l.marble_thickness for l in product_lines], dtype=float),
+                'block': np.array([l.lot_general or '' for l in product_lines], dtype=object),
+            }
+            slab_data = {
+                'long': np.array([s.marble_long_side for s in slabs], dtype=float),
+                'short': np.array([s.marble_short_side for s in slabs], dtype=float),
+                'sqm': np.array([s.marble_sqm for s in slabs], dtype=float),
+                'thickness': np.array([s.marble_thickness for s in slabs], dtype=float),
+                'block': np.array([s.lot_general or '' for s in slabs], dtype=object),
+            }
+            cost = score_candidates(line_data, slab_data)
+            for row, col in solve_assignment(cost):
+                allocation[product_lines[row].id] = slabs[col].id
+        return allocation
@@ -0,0 +1,151 @@
+# models/marble_stock_summary.py
+
+import functools
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import create_unique_index
+
+# Pares (product_id, location_id) cuyo resumen hay que recalcular al confirmar
+PENDING_SUMMARY_KEY = 'marble.summary_pairs'
+
+
+class MarbleStockSummary(models.Model):
+    _name = 'marble.stock.summary'
+    _description = 'Resumen de Existencias en m²'
+    _order = 'product_id, lot_general, marble_thickness, numero_contenedor, location_id'
+
+    product_id = fields.Many2one('product.product', 'Producto', readonly=True, index=True)
+    lot_general = fields.Char('Lote', readonly=True)
+    marble_thickness = fields.Float('Grosor (cm)', readonly=True)
+    numero_contenedor = fields.Char('Número de Contenedor', readonly=True)
+    location_id = fields.Many2one('stock.location', 'Ubicación', readonly=True, index=True)
+    warehouse_id = fields.Many2one('stock.warehouse', 'Almacén', readonly=True, index=True)
+    company_id = fields.Many2one('res.company', 'Compañía', readonly=True)
+    sqm_on_hand = fields.Float('m² a la Mano', readonly=True)
+    sqm_reserved = fields.Float('m² Reservados', readonly=True)
+    sqm_free = fields.Float('m² Libres', readonly=True)
+    slab_count = fields.Float('Piezas', readonly=True)
+
+    def init(self):
+        create_unique_index(
+            self.env.cr, 'marble_stock_summary_key_uniq', self._table,
+            ['product_id', 'lot_general', 'marble_thickness', 'numero_contenedor', 'location_id'],
+        )
+
+    @api.model
+    def _mark_dirty(self, pairs):
+        """Anota pares (product_id, location_id) para recalcular antes del commit."""
+        pairs = {(product_id, location_id) for product_id, location_id in pairs if product_id and location_id}
+        if not pairs:
+            return
+        pending = self.env.cr.precommit.data.setdefault(PENDING_SUMMARY_KEY, set())
+        if not pending:
+            self.env.cr.precommit.add(functools.partial(self._refresh_pending, pending))
+        pending.update(pairs)
+
+    @api.model
+    def _refresh_pending(self, pending):
+        if pending:
+            self._refresh(sorted(pending))
+            pending.clear()
+
+    @api.model
+    def _summary_select(self, pairs=None):
+        """SELECT agregado desde stock_quant, opcionalmente limitado a unos pares."""
+        pair_filter = SQL()
+        if pairs is not None:
+            pair_filter = SQL(
+                "AND (quant.product_id, quant.location_id) IN (SELECT * FROM unnest(%s::int[], %s::int[]))",
+                [product_id for product_id, _location_id in pairs],
+                [location_id for _product_id, location_id in pairs],
+            )
+        return SQL(
+            """
+            SELECT quant.product_id,
+                   COALESCE(quant.lot_general, '') AS lot_general,
+                   COALESCE(quant.marble_thickness, 0.0) AS marble_thickness,
+                   COALESCE(quant.numero_contenedor, '') AS numero_contenedor,
+                   quant.location_id,
+                   location.warehouse_id,
+                   quant.company_id,
+                   SUM(quant.quantity * COALESCE(quant.marble_sqm, 0.0)) AS sqm_on_hand,
+                   SUM(quant.reserved_quantity * COALESCE(quant.marble_sqm, 0.0)) AS sqm_reserved,
+                   SUM((quant.quantity - quant.reserved_quantity) * COALESCE(quant.marble_sqm, 0.0)) AS sqm_free,
+                   SUM(quant.quantity) AS slab_count
+              FROM stock_quant quant
+              JOIN stock_location location ON location.id = quant.location_id
+             WHERE location.usage = 'internal'
+               AND quant.quantity > 0
+               %s
+          GROUP BY quant.product_id, 2, 3, 4, quant.location_id, location.warehouse_id, quant.company_id
+            """,
+            pair_filter,
+        )
+
+    @api.model
+    def _flush_sources(self):
+        self.env['stock.quant'].flush_model([
+            'product_id', 'location_id', 'company_id', 'quantity', 'reserved_quantity',
+            'lot_general', 'marble_thickness', 'numero_contenedor', 'marble_sqm',
+        ])
+        self.env['stock.location'].flush_model(['usage', 'warehouse_id'])
+
+    @api.model
+    def _refresh(self, pairs):
+        """
+        Recalcula solo las filas de los pares (product_id, location_id) dados:
+        inserta/actualiza las combinaciones presentes y borra las que ya no
+        tienen existencias.
+        """
+        self._flush_sources()
+        product_ids = [product_id for product_id, _location_id in pairs]
+        location_ids = [location_id for _product_id, location_id in pairs]
+        self.env.cr.execute(SQL(
+            """
+            WITH fresh AS (%(select)s),
+            upserted AS (
+                INSERT INTO marble_stock_summary AS summary
+                       (product_id, lot_general, marble_thickness, numero_contenedor, location_id,
+                        warehouse_id, company_id, sqm_on_hand, sqm_reserved, sqm_free, slab_count)
+                SELECT * FROM fresh
+                    ON CONFLICT (product_id, lot_general, marble_thickness, numero_contenedor, location_id)
+                    DO UPDATE SET warehouse_id = EXCLUDED.warehouse_id,
+                                  company_id = EXCLUDED.company_id,
+                                  sqm_on_hand = EXCLUDED.sqm_on_hand,
+                                  sqm_reserved = EXCLUDED.sqm_reserved,
+                                  sqm_free = EXCLUDED.sqm_free,
+                                  slab_count = EXCLUDED.slab_count
+             RETURNING summary.id
+            )
+            DELETE FROM marble_stock_summary summary
+             WHERE (summary.product_id, summary.location_id) IN (
+                       SELECT * FROM unnest(%(product_ids)s::int[], %(location_ids)s::int[]))
+               AND summary.id NOT IN (SELECT id FROM upserted)
+            """,
+            select=self._summary_select(pairs),
+            product_ids=product_ids,
+            location_ids=location_ids,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Reconstrucción completa del resumen a partir de stock_quant."""
+        self._flush_sources()
+        self.env.cr.execute(SQL("DELETE FROM marble_stock_summary"))
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO marble_stock_summary
+                   (product_id, lot_general, marble_thickness, numero_contenedor, location_id,
+                    warehouse_id, company_id, sqm_on_hand, sqm_reserved, sqm_free, slab_count)
+            %s
+            """,
+            self._summary_select(),
+        ))
+        self.invalidate_model()
+
+    def action_rebuild(self):
+        self.check_access('write')
+        self._rebuild()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
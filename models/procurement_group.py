@@ -1,125 +1,138 @@
+from collections import defaultdict
+
 from odoo import models, api
 
+from .marble_perf_stat import instrument
+
+MARBLE_PURCHASE_FIELDS = (
+    'marble_height', 'marble_width', 'marble_sqm',
+    'lot_general', 'marble_thickness', 'numero_contenedor',
+)
+# Datos que identifican una placa en la compra (los m² se derivan de ellos)
+MARBLE_SLAB_FIELDS = (
+    'marble_height', 'marble_width', 'lot_general', 'marble_thickness', 'numero_contenedor',
+)
+
+
+def marble_slab_key(sale_line_id, read):
+    """
+    Clave de una placa en la compra: su línea de venta y sus datos de mármol.
+    `read(campo)` lee el valor del procurement o de la línea de compra.
+    """
+    return (sale_line_id or 0,) + tuple(str(read(field) or '') for field in MARBLE_SLAB_FIELDS)
+
+
 class StockRule(models.Model):
     _inherit = 'stock.rule'
 
+    @instrument('stock.rule._run_buy')
     def _run_buy(self, procurements):  # procurements es una lista de tuplas (procurement_request, rule)
-        procurement_data_to_apply = {}  # {proc_key: marble_data_dict}
-        # Nuevo: mapeo de proc_key a los valores originales del procurement_request para _prepare_purchase_order_line
-        original_proc_values_map = {}
-
-        # BUCLE 1: Extraer y almacenar los datos de mármol
+        """
+        Los datos de mármol se resuelven por procurement (es decir, por línea de
+        venta y sus moves destino) y se guardan en los propios `values` del
+        procurement, de donde los toma _prepare_purchase_order_line. Después se
+        reafirman en las líneas de compra con una sola búsqueda sobre todos los
+        move_dest_ids y escrituras agrupadas por payload.
+        """
+        # Precargar de una vez los moves destino de todos los procurements
+        dest_moves = self.env['stock.move'].union(*(
+            procurement.values['move_dest_ids']
+            for procurement, rule in procurements
+            if isinstance((procurement.values or {}).get('move_dest_ids'), models.BaseModel)
+        ))
+        dest_moves.fetch(list(MARBLE_PURCHASE_FIELDS))
+
+        marble_data_by_move = {}  # {move_id: marble_data_dict}
         for procurement_request, rule in procurements:
-            if not hasattr(procurement_request, 'product_id') or \
-               not hasattr(procurement_request, 'origin') or \
-               not hasattr(procurement_request, 'values'):
+            current_proc_values = procurement_request.values
+            if current_proc_values is None:
                 continue
-
-            product_record = procurement_request.product_id
-            origin_str = procurement_request.origin  # Este es el SO (ej. S00002)
-
-            # procurement_request.values es el diccionario de valores que llega a _run_buy.
-            current_proc_values = procurement_request.values or {}
-
-            proc_key = f"{product_record.id}_{origin_str}"
-            original_proc_values_map[proc_key] = current_proc_values  # Guardamos los valores que SÍ llegan
-
-            marble_data_found = {}
-
-            # Intento 1: ¿Están los campos de mármol directamente en current_proc_values?
-            if 'marble_sqm' in current_proc_values and current_proc_values.get('marble_sqm', 0.0) > 0:
-                marble_data_found = {
-                    'marble_height': current_proc_values.get('marble_height', 0.0),
-                    'marble_width': current_proc_values.get('marble_width', 0.0),
-                    'marble_sqm': current_proc_values.get('marble_sqm', 0.0),
-                    'lot_general': current_proc_values.get('lot_general', ''),
-                    'marble_thickness': current_proc_values.get('marble_thickness', 0.0),
-                    'numero_contenedor': current_proc_values.get('numero_contenedor', ''),
-                }
-
-            # Intento 2: Si no, intentar obtenerlos del stock.move de origen (move_dest_ids)
-            if not marble_data_found and 'move_dest_ids' in current_proc_values and current_proc_values['move_dest_ids']:
-                source_moves = current_proc_values['move_dest_ids']
-                if isinstance(source_moves, models.BaseModel) and source_moves._name == 'stock.move':
-                    first_move = source_moves[0] if source_moves else None
-                    if first_move and first_move.marble_sqm > 0:  # Chequeamos si el move tiene los m2
-                        marble_data_found = {
-                            'marble_height': first_move.marble_height,
-                            'marble_width': first_move.marble_width,
-                            'marble_sqm': first_move.marble_sqm,
-                            'lot_general': first_move.lot_general,
-                            'marble_thickness': first_move.marble_thickness,
-                            'numero_contenedor': first_move.numero_contenedor,
-                            
-                        }
-                        # IMPORTANTE: Añadir estos datos al diccionario original_proc_values_map[proc_key]
-                        original_proc_values_map[proc_key].update(marble_data_found)
-
-            if marble_data_found:
-                procurement_data_to_apply[proc_key] = marble_data_found
-
-        # Pasar el mapa de valores originales al contexto para que _prepare_purchase_order_line lo use
-        self_with_context = self.with_context(original_proc_values_map=original_proc_values_map)
-
-        res = super(StockRule, self_with_context)._run_buy(procurements)  # Llamar a super con el contexto modificado
-
-        # BUCLE 2: Aplicar/Reafirmar los datos de mármol a las PO Lines.
-        if procurement_data_to_apply:
-            for procurement_request, rule in procurements:
-                if not hasattr(procurement_request, 'product_id') or not hasattr(procurement_request, 'origin'):
-                    continue
-                product_record = procurement_request.product_id
-                origin_str = procurement_request.origin
-                proc_key = f"{product_record.id}_{origin_str}"
-
-                if proc_key in procurement_data_to_apply:
-                    marble_data = procurement_data_to_apply[proc_key]
-                    current_proc_values = procurement_request.values or {}
-                    move_dest_ids_val = current_proc_values.get('move_dest_ids')
-
-                    if move_dest_ids_val:
-                        actual_move_ids = []
-                        # Asegurarse de que move_dest_ids_val es un iterable de IDs
-                        if isinstance(move_dest_ids_val, models.BaseModel):  # Si es un recordset
-                            actual_move_ids = move_dest_ids_val.ids
-                        elif isinstance(move_dest_ids_val, (list, tuple)) and all(isinstance(i, int) for i in move_dest_ids_val):  # Si es una lista/tupla de IDs
-                            actual_move_ids = list(move_dest_ids_val)
-                        elif isinstance(move_dest_ids_val, int):  # Si es un solo ID
-                            actual_move_ids = [move_dest_ids_val]
-
-                        if not actual_move_ids:
-                            continue
-
-                        po_lines = self.env['purchase.order.line'].search([
-                            ('move_dest_ids', 'in', actual_move_ids)
-                        ])
-
-                        if po_lines:
-                            for po_line in po_lines:
-                                po_line.with_context(from_procurement=True).write(marble_data)
+            marble_data_found = self._get_marble_procurement_data(current_proc_values)
+            if not marble_data_found:
+                continue
+            # Los datos viajan con el procurement, no por el contexto
+            current_proc_values.update(marble_data_found)
+            for move_id in self._get_marble_move_dest_ids(current_proc_values.get('move_dest_ids')):
+                marble_data_by_move[move_id] = marble_data_found
+
+        res = super()._run_buy(procurements)
+
+        # Aplicar/Reafirmar los datos de mármol a las PO Lines.
+        if marble_data_by_move:
+            po_lines = self.env['purchase.order.line'].search([
+                ('move_dest_ids', 'in', list(marble_data_by_move))
+            ])
+            po_line_ids_by_payload = defaultdict(list)
+            for po_line in po_lines:
+                move_id = next(m.id for m in po_line.move_dest_ids if m.id in marble_data_by_move)
+                payload = tuple(marble_data_by_move[move_id].items())
+                po_line_ids_by_payload[payload].append(po_line.id)
+            PurchaseLine = self.env['purchase.order.line'].with_context(from_procurement=True)
+            for payload, po_line_ids in po_line_ids_by_payload.items():
+                PurchaseLine.browse(po_line_ids).write(dict(payload))
         return res
 
-    def _prepare_purchase_order_line(self, product_id, product_qty, product_uom, company_id, values, po):
-        origin_str = values.get('origin')  # El origin del procurement_request
-        proc_key = f"{product_id.id}_{origin_str}"
-
-        original_proc_values_map = self.env.context.get('original_proc_values_map', {})
-        # Usar los valores enriquecidos del mapa si existen para esta clave, sino los 'values' directos.
-        values_for_po_line = original_proc_values_map.get(proc_key, values)
+    def _get_procurements_to_merge_groupby(self, procurement):
+        # Dos placas del mismo producto no se funden en una línea de compra
+        return super()._get_procurements_to_merge_groupby(procurement) + (self._marble_procurement_key(procurement),)
+
+    def _get_procurements_to_merge_sorted(self, procurement):
+        return super()._get_procurements_to_merge_sorted(procurement) + (self._marble_procurement_key(procurement),)
+
+    @api.model
+    def _marble_procurement_key(self, procurement):
+        """Clave de placa del procurement; vacía si no lleva datos de mármol."""
+        values = procurement.values
+        if not values.get('marble_sqm', 0.0) > 0:
+            return ()
+        return marble_slab_key(values.get('sale_line_id'), values.get)
+
+    @api.model
+    def _get_marble_procurement_data(self, values):
+        """
+        Datos de mármol de un procurement: directamente de sus `values` o, si no
+        vienen ahí, del primer stock.move de origen (move_dest_ids).
+        """
+        if values.get('marble_sqm', 0.0) > 0:
+            return {
+                'marble_height': values.get('marble_height', 0.0),
+                'marble_width': values.get('marble_width', 0.0),
+                'marble_sqm': values.get('marble_sqm', 0.0),
+                'lot_general': values.get('lot_general', ''),
+                'marble_thickness': values.get('marble_thickness', 0.0),
+                'numero_contenedor': values.get('numero_contenedor', ''),
+            }
+        source_moves = values.get('move_dest_ids')
+        if isinstance(source_moves, models.BaseModel) and source_moves._name == 'stock.move' and source_moves:
+            first_move = source_moves[0]
+            if first_move.marble_sqm > 0:  # Chequeamos si el move tiene los m2
+                return {field: first_move[field] for field in MARBLE_PURCHASE_FIELDS}
+        return {}
+
+    @api.model
+    def _get_marble_move_dest_ids(self, move_dest_ids_val):
+        # Asegurarse de que move_dest_ids_val es un iterable de IDs
+        if isinstance(move_dest_ids_val, models.BaseModel):  # Si es un recordset
+            return move_dest_ids_val.ids
+        if isinstance(move_dest_ids_val, (list, tuple)) and all(isinstance(i, int) for i in move_dest_ids_val):
+            return list(move_dest_ids_val)
+        if isinstance(move_dest_ids_val, int):  # Si es un solo ID
+            return [move_dest_ids_val]
+        return []
 
+    def _prepare_purchase_order_line(self, product_id, product_qty, product_uom, company_id, values, po):
         # Llamar a super con los 'values' originales.
         res_vals = super()._prepare_purchase_order_line(product_id, product_qty, product_uom, company_id, values, po)
 
-        marble_fields_to_set = {}
-        # Ahora usamos 'values_for_po_line' que debería tener los datos de mármol.
-        if values_for_po_line.get('marble_sqm', 0.0) > 0:  # Condición principal para aplicar datos de mármol
-            marble_fields_to_set['marble_sqm'] = values_for_po_line.get('marble_sqm', 0.0)
-            marble_fields_to_set['marble_height'] = values_for_po_line.get('marble_height', 0.0)
-            marble_fields_to_set['marble_width'] = values_for_po_line.get('marble_width', 0.0)
-            marble_fields_to_set['lot_general'] = values_for_po_line.get('lot_general', '')
-            marble_fields_to_set['marble_thickness'] = values_for_po_line.get('marble_thickness', 0.0)
-            marble_fields_to_set['numero_contenedor'] = values_for_po_line.get('numero_contenedor', '')
-        if marble_fields_to_set:
-            res_vals.update(marble_fields_to_set)
+        # _run_buy ya dejó los datos de mármol en los 'values' de este procurement.
+        if values.get('marble_sqm', 0.0) > 0:  # Condición principal para aplicar datos de mármol
+            res_vals.update({
+                'marble_sqm': values.get('marble_sqm', 0.0),
+                'marble_height': values.get('marble_height', 0.0),
+                'marble_width': values.get('marble_width', 0.0),
+                'lot_general': values.get('lot_general', ''),
+                'marble_thickness': values.get('marble_thickness', 0.0),
+                'numero_contenedor': values.get('numero_contenedor', ''),
+            })
 
         return res_vals
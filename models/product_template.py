@@ -1,5 +1,8 @@
 # models/product_template.py
-from odoo import models, fields
+from odoo import models, fields, api
+
+# Campos cuyo cambio obliga a repreciar las cotizaciones abiertas
+SQM_PRICE_FIELDS = ('price_per_sqm_min', 'price_per_sqm_avg', 'price_per_sqm_max')
 
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
@@ -31,4 +34,34 @@ class ProductTemplate(models.Model):
         help="Si se marca, será obligatorio seleccionar un número de lote/serie en la orden de venta si hay stock disponible.\n"
              "Desmarcar para productos (como porcelanato) donde el lote se puede asignar durante el picking en el almacén."
     )
-    # --- FIN DEL CAMBIO ---
\ No newline at end of file
+    # --- FIN DEL CAMBIO ---
+
+    # Pendiente de repreciar cotizaciones tras cambiar los precios por m²
+    marble_price_dirty = fields.Boolean(
+        string='Repreciar Cotizaciones',
+        copy=False,
+        index='btree_not_null',
+    )
+
+    def write(self, vals):
+        if not {'marble_price_dirty'} & vals.keys() and set(SQM_PRICE_FIELDS) & vals.keys():
+            vals = dict(vals, marble_price_dirty=True)
+        return super().write(vals)
+
+    @api.model
+    def _cron_reprice_quotations(self):
+        """
+        Aplica los nuevos precios por m² a las líneas de las cotizaciones
+        abiertas (borrador/enviada) de los productos marcados, con el nivel de
+        precio de cada línea y escrituras agrupadas.
+        """
+        templates = self.search([('marble_price_dirty', '=', True)])
+        if not templates:
+            return
+        lines = self.env['sale.order.line'].search([
+            ('product_template_id', 'in', templates.ids),
+            ('state', 'in', ('draft', 'sent')),
+            ('price_level', '!=', 'manual'),
+        ])
+        lines._marble_apply_price_level()
+        templates.marble_price_dirty = False
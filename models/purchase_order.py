@@ -1,26 +1,21 @@
 # models/purchase_order.py
 
 from odoo import models
-import logging
 
-_logger = logging.getLogger(__name__)
+from .marble_perf_stat import instrument
 
 class PurchaseOrder(models.Model):
     _inherit = 'purchase.order'
 
+    @instrument('purchase.order._prepare_stock_moves')
     def _prepare_stock_moves(self, picking):
         """
         Sobrescribir para asegurar que cada línea de PO genere su propio move
         """
         self.ensure_one()
-        _logger.info("🏭 DEBUG: PurchaseOrder._prepare_stock_moves para orden %s", self.name)
-        _logger.info("🏭 DEBUG: Número de líneas en la orden: %s", len(self.order_line))
-        
         res = []
 
         for line in self.order_line:
-            _logger.info("📋 DEBUG: Procesando línea orden %s - Producto: %s", line.id, line.product_id.name)
-            
             # Crear un move individual para cada línea
             move_vals = line._prepare_stock_move_vals(
                 picking, 
@@ -51,33 +46,21 @@ class PurchaseOrder(models.Model):
                 'purchase_line_id': line.id,
                 'origin': f"{self.name} - Línea {line.id}",
             })
-            
-            _logger.info("📋 DEBUG: Move vals para línea %s: %s", line.id, move_vals)
             res.append(move_vals)
 
-        _logger.info("🏭 DEBUG: Total move_vals preparados: %s", len(res))
         return res
 
+    @instrument('purchase.order.button_confirm')
     def button_confirm(self):
-        """
-        Agregar logs al confirmar la orden
-        """
-        _logger.info("🔘 DEBUG: button_confirm llamado para orden %s", self.name)
-        _logger.info("🔘 DEBUG: Estado actual: %s", self.state)
-        
-        result = super().button_confirm()
-        
-        _logger.info("🔘 DEBUG: Orden confirmada. Nuevo estado: %s", self.state)
-        
-        # Log de los pickings creados
-        pickings = self.picking_ids
-        _logger.info("🔘 DEBUG: Pickings creados: %s", len(pickings))
-        
-        for picking in pickings:
-            _logger.info("📦 DEBUG: Picking %s - Moves: %s", picking.name, len(picking.move_ids_without_package))
-            for move in picking.move_ids_without_package:
-                _logger.info("📦 DEBUG: Move %s - Producto: %s, Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                           move.id, move.product_id.name, move.marble_height, move.marble_width, 
-                           move.marble_sqm, move.lot_general)
-        
-        return result
\ No newline at end of file
+        return super().button_confirm()
+
+    def action_open_packing_list_import(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Importar Packing List',
+            'res_model': 'marble.packing.list.import',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_order_id': self.id},
+        }
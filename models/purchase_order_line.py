@@ -1,9 +1,9 @@
 # models/purchase_order_line.py
 
 from odoo import models, fields, api
-import logging
 
-_logger = logging.getLogger(__name__)
+from .marble_perf_stat import instrument
+from .procurement_group import marble_slab_key
 
 class PurchaseOrderLine(models.Model):
     _inherit = 'purchase.order.line'
@@ -40,15 +40,31 @@ class PurchaseOrderLine(models.Model):
         lines = super().create(vals_list)
         return lines
 
+    def _find_candidate(self, product_id, product_qty, product_uom, location_id, name, origin, company_id, values):
+        """
+        Un procurement de mármol solo reutiliza la línea de compra de su misma
+        placa (misma línea de venta y mismos datos de mármol), nunca la de otra
+        placa del mismo producto.
+        """
+        lines = self
+        if values.get('marble_sqm', 0.0) > 0:
+            key = marble_slab_key(values.get('sale_line_id'), values.get)
+            lines = self.filtered(lambda line: line._marble_slab_key() == key)
+        return super(PurchaseOrderLine, lines)._find_candidate(
+            product_id, product_qty, product_uom, location_id, name, origin, company_id, values,
+        )
+
+    def _marble_slab_key(self):
+        self.ensure_one()
+        sale_lines = self.move_dest_ids.sale_line_id
+        # Una línea que ya abastece varias ventas no es de ninguna placa concreta
+        sale_line_id = sale_lines.id if len(sale_lines) <= 1 else -1
+        return marble_slab_key(sale_line_id, lambda field: self[field])
+
     def _prepare_stock_move_vals(self, picking, price_unit, product_uom_qty, product_uom):
         self.ensure_one()
         vals = super()._prepare_stock_move_vals(picking, price_unit, product_uom_qty, product_uom)
         
-        _logger.info("🔍 DEBUG: _prepare_stock_move_vals para línea PO %s", self.id)
-        _logger.info("🔍 DEBUG: Producto: %s, Cantidad: %s", self.product_id.name, product_uom_qty)
-        _logger.info("🔍 DEBUG: Datos mármol - Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                    self.marble_height, self.marble_width, self.marble_sqm, self.lot_general)
-        
         # CLAVE: Añadir un identificador único para evitar agrupación
         vals.update({
             'marble_height': self.marble_height or 0.0,
@@ -61,24 +77,18 @@ class PurchaseOrderLine(models.Model):
             'purchase_line_id': self.id,
             'origin': f"{self.order_id.name} - Línea {self.id}",
         })
-        
-        _logger.info("🔍 DEBUG: Stock move vals preparados: %s", vals)
         return vals
 
+    @instrument('purchase.order.line._create_stock_moves')
     def _create_stock_moves(self, picking):
         """
-        Sobrescribir para asegurar que cada línea genera su propio move independiente
+        Sobrescribir para asegurar que cada línea genera su propio move independiente.
+        Los valores de todas las líneas se preparan primero y los moves se crean
+        con un único create múltiple (un move por línea, en el mismo orden).
         """
-        _logger.info("🚀 DEBUG: _create_stock_moves llamado para %s líneas", len(self))
-        
-        moves = self.env['stock.move']
-        
+        vals_list = []
         for line in self:
-            _logger.info("🔄 DEBUG: Procesando línea PO %s - Producto: %s", line.id, line.product_id.name)
-            _logger.info("🔄 DEBUG: Datos línea - Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                        line.marble_height, line.marble_width, line.marble_sqm, line.lot_general)
-            
-            # Crear un move individual para cada línea
+            # Un move individual para cada línea
             move_vals = line._prepare_stock_move_vals(
                 picking, 
                 line.price_unit, 
@@ -88,25 +98,14 @@ class PurchaseOrderLine(models.Model):
             
             # Asegurar que el move tenga un nombre único
             move_vals['name'] = f"{line.order_id.name} - {line.product_id.name} - Línea {line.id}"
+            vals_list.append(move_vals)
             
-            _logger.info("🔄 DEBUG: Creando move con vals: %s", move_vals)
-            
-            move = self.env['stock.move'].create(move_vals)
-            moves |= move
-            
-            _logger.info("✅ DEBUG: Move creado ID: %s - Nombre: %s", move.id, move.name)
-            _logger.info("✅ DEBUG: Move datos - Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                        move.marble_height, move.marble_width, move.marble_sqm, move.lot_general)
-            
-        _logger.info("🏁 DEBUG: Total moves creados: %s", len(moves))
-        return moves
+        return self.env['stock.move'].create(vals_list)
 
     def _get_stock_move_map(self):
         """
         Sobrescribir para evitar que Odoo agrupe movimientos por producto
         """
-        _logger.info("🗺️ DEBUG: _get_stock_move_map llamado para %s líneas", len(self))
-        
         # En lugar de agrupar por producto, crear un mapeo único por línea
         move_map = {}
         for line in self:
@@ -117,7 +116,4 @@ class PurchaseOrderLine(models.Model):
                 'product_uom': line.product_uom.id,
                 'lines': [line],
             }
-            _logger.info("🗺️ DEBUG: Mapeando línea %s con clave única: %s", line.id, key)
-        
-        _logger.info("🗺️ DEBUG: Move map final: %s", move_map)
-        return move_map
\ No newline at end of file
+        return move_map
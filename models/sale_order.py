@@ -1,29 +1,35 @@
-from odoo import models, api
+from collections import defaultdict
+
+from odoo import models, api, _, Command
+
+from .marble_perf_stat import instrument
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
 
+    @instrument('sale.order.action_cancel')
     def action_cancel(self):
+        """
+        Cancela todos los pedidos de una vez: un solo _action_cancel sobre los
+        movimientos pendientes del conjunto y la restauración de los grupos de
+        abastecimiento agrupada por grupo.
+        """
         # Guardar procurement_group_id antes de cancelar
         procurement_groups = {
             order.id: order.procurement_group_id.id
             for order in self
             if order.procurement_group_id
         }
-        # Cancelar los stock moves pendientes
-        for order in self:
-            moves = order.order_line.mapped('move_ids').filtered(
-                lambda m: m.state not in ('done', 'cancel')
-            )
-            if moves:
-                moves._action_cancel()
+        # Cancelar los stock moves pendientes de todos los pedidos
+        moves = self.order_line.move_ids.filtered(lambda m: m.state not in ('done', 'cancel'))
+        if moves:
+            moves._action_cancel()
         # Cambiar estado a 'cancel' sin limpiar procurement_group_id
         result = self.write({'state': 'cancel'})
         # Restaurar procurement_group_id
-        for order in self:
-            saved = procurement_groups.get(order.id)
-            if saved and (not order.procurement_group_id or order.procurement_group_id.id != saved):
-                order.procurement_group_id = saved
+        self._marble_restore_procurement_groups(
+            procurement_groups, lambda order, saved: order.procurement_group_id.id != saved,
+        )
         return result
 
     def action_draft(self):
@@ -35,17 +41,70 @@ class SaleOrder(models.Model):
         }
         result = super().action_draft()
         # Restaurar procurement_group_id si se perdió
-        for order in self:
-            saved = procurement_groups.get(order.id)
-            if saved and not order.procurement_group_id:
-                order.procurement_group_id = saved
+        self._marble_restore_procurement_groups(
+            procurement_groups, lambda order, saved: not order.procurement_group_id,
+        )
         return result
 
+    def _marble_restore_procurement_groups(self, procurement_groups, needs_restore):
+        """Vuelve a poner los grupos guardados, con un write por grupo distinto."""
+        order_ids_by_group = defaultdict(list)
+        for order in self.browse(procurement_groups):
+            saved = procurement_groups[order.id]
+            if needs_restore(order, saved):
+                order_ids_by_group[saved].append(order.id)
+        for group_id, order_ids in order_ids_by_group.items():
+            self.browse(order_ids).write({'procurement_group_id': group_id})
+
+    @instrument('sale.order.action_confirm')
     def action_confirm(self):
-        # Reutilizar procurement_group_id y PO existentes si aplica
-        for order in self:
-            if order.procurement_group_id:
-                self.env['purchase.order'].search([
-                    ('group_id', '=', order.procurement_group_id.id)
-                ])
         return super().action_confirm()
+
+    @instrument('sale.order.action_auto_allocate_slabs')
+    def action_auto_allocate_slabs(self):
+        """
+        Asigna automáticamente placas a las líneas sin lote de las cotizaciones,
+        resolviendo todas las líneas a la vez (menor desperdicio, grosor y
+        bloque coherentes, sin repetir placas). Los datos de mármol de cada
+        placa se escriben en un solo write por pedido.
+        """
+        lines = self.filtered(lambda o: o.state in ('draft', 'sent')).order_line
+        allocation = self.env['marble.slab.allocator']._allocate(lines)
+
+        lots = self.env['stock.lot'].browse(allocation.values())
+        lots.fetch([
+            'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+            'marble_thickness', 'numero_contenedor',
+        ])
+        commands_by_order = {}
+        for line in lines.filtered(lambda l: l.id in allocation):
+            lot = lots.browse(allocation[line.id])
+            commands_by_order.setdefault(line.order_id, []).append(Command.update(line.id, {
+                'lot_id':            lot.id,
+                'marble_height':     lot.marble_height,
+                'marble_width':      lot.marble_width,
+                'marble_sqm':        lot.marble_sqm,
+                'lot_general':       lot.lot_general,
+                'marble_thickness':  lot.marble_thickness,
+                'numero_contenedor': lot.numero_contenedor,
+            }))
+        for order, commands in commands_by_order.items():
+            order.write({'order_line': commands})
+        # Precio según el nivel de cada línea, ahora que tienen placa
+        lines.filtered(lambda l: l.id in allocation)._marble_apply_price_level()
+
+        pending = len(lines.filtered(
+            lambda l: not l.display_type and l.product_id and not l.lot_id and l.product_id.tracking != 'none'
+        ))
+        message = _("Placas asignadas: %(assigned)s. Líneas sin placa compatible: %(pending)s.",
+                    assigned=len(allocation), pending=pending)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Asignación automática de placas'),
+                'message': message,
+                'type': 'success' if not pending else 'warning',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
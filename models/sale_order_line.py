@@ -1,8 +1,12 @@
 # models/sale_order_line.py
 
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .marble_perf_stat import instrument
+
 class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
 
@@ -28,7 +32,9 @@ class SaleOrderLine(models.Model):
     lot_id = fields.Many2one(
         'stock.lot',
         string='Número de Serie',
-        domain="[('id', 'in', available_lot_ids)]",
+        # Se evalúa en el servidor al buscar (paginado), sin enviar la lista de lotes
+        domain="[('product_id', '=', product_id), "
+               "('quant_ids', 'any', [('quantity', '>', 0), ('location_id.usage', '=', 'internal')])]",
     )
     available_lot_ids = fields.Many2many(
         'stock.lot',
@@ -100,24 +106,47 @@ class SaleOrderLine(models.Model):
                     )
                 }
             }
+
+    def _marble_apply_price_level(self, price_level=None):
+        """
+        Versión en lote de _onchange_lot_pricing: aplica `price_level` (o el
+        nivel de cada línea) y recalcula price_unit = m² × precio por m².
+        En modo manual solo cambia el nivel; las escrituras se agrupan por
+        payload (mismo nivel, precio por m² y precio unitario).
+        """
+        self.product_id.fetch(['price_per_sqm_max', 'price_per_sqm_avg', 'price_per_sqm_min'])
+
+        line_ids_by_payload = defaultdict(list)
+        for line in self:
+            level = price_level or line.price_level
+            vals = {'price_level': level}
+            if level == 'manual':
+                pass
+            elif line.lot_id and line.product_id:
+                price_per_sqm = line.product_id[f'price_per_sqm_{level}'] or 0.0
+                vals['applied_price_per_sqm'] = price_per_sqm
+                if price_per_sqm and line.marble_sqm:
+                    vals['price_unit'] = line.marble_sqm * price_per_sqm
+            else:
+                vals['applied_price_per_sqm'] = 0.0
+            # Solo los valores que cambian forman el payload
+            payload = tuple(sorted(
+                (field, value) for field, value in vals.items() if line[field] != value
+            ))
+            if payload:
+                line_ids_by_payload[payload].append(line.id)
+
+        for payload, line_ids in line_ids_by_payload.items():
+            self.browse(line_ids).write(dict(payload))
     # --- FIN: MÉTODOS DE sale_order_line_pricing.py ---
 
 
     # --- INICIO: MÉTODOS DE sale_order_line.py ---
     @api.depends('product_id')
     def _compute_available_lots(self):
-        Quant = self.env['stock.quant']
+        lots_by_product = self.env['stock.quant']._marble_available_lots(self.product_id)
         for line in self:
-            if line.product_id:
-                quants = Quant.search([
-                    ('product_id', '=', line.product_id.id),
-                    ('quantity', '>', 0),
-                    ('location_id.usage', '=', 'internal'),
-                    ('lot_id', '!=', False),
-                ])
-                line.available_lot_ids = quants.mapped('lot_id')
-            else:
-                line.available_lot_ids = False
+            line.available_lot_ids = lots_by_product.get(line.product_id.id, False)
 
     @api.depends('marble_height', 'marble_width')
     def _compute_marble_sqm(self):
@@ -139,20 +168,18 @@ class SaleOrderLine(models.Model):
 
     @api.depends('lot_id')
     def _compute_pedimento_number(self):
-        Quant = self.env['stock.quant']
+        """
+        El pedimento se fija al elegir el lote (existencias internas o en
+        tránsito) y no sigue al del lote: al entregar la placa su quant
+        interno queda a cero y el dato aduanero de la línea debe conservarse.
+        """
+        pedimentos = self.lot_id._origin._marble_resolve_pedimento_numbers(usages=('internal', 'transit'))
         for line in self:
-            if line.lot_id:
-                quant = Quant.search([
-                    ('lot_id', '=', line.lot_id.id),
-                    ('quantity', '>', 0),
-                    ('location_id.usage', 'in', ['internal', 'transit']),
-                ], limit=1, order='in_date DESC')
-                line.pedimento_number = quant.pedimento_number or ''
-            else:
-                line.pedimento_number = ''
+            line.pedimento_number = pedimentos.get(line.lot_id._origin.id) or ''
 
     @api.constrains('lot_id', 'product_id')
     def _check_lot_requirement(self):
+        lots_by_product = self.env['stock.quant']._marble_available_lots(self.product_id)
         for line in self:
             if line.product_id and line.product_id.tracking != 'none':
                 is_mto = any(
@@ -164,7 +191,7 @@ class SaleOrderLine(models.Model):
                     continue
                 
                 # LA LÓGICA CLAVE ESTÁ AQUÍ Y ESTÁ CORRECTA
-                if line.product_id.require_lot_selection_on_sale and line.available_lot_ids and not line.lot_id:
+                if line.product_id.require_lot_selection_on_sale and lots_by_product.get(line.product_id.id) and not line.lot_id:
                     raise ValidationError(_(
                         'El producto "%s" tiene stock disponible. '
                         'Debe seleccionar un lote específico.'
@@ -186,32 +213,13 @@ class SaleOrderLine(models.Model):
         })
         return vals
 
+    @instrument('sale.order.line._action_launch_stock_rule')
     def _action_launch_stock_rule(self, previous_product_uom_qty=False):
-        for line in self:
-            if line.product_id.tracking != 'none' or line.marble_sqm > 0:
-                group = self.env['procurement.group'].create({
-                    'name':        f"{line.order_id.name}/L{line.id}",
-                    'sale_id':     line.order_id.id,
-                    'partner_id':  line.order_id.partner_id.id,
-                })
-                proc_values = line._prepare_procurement_values(group_id=group.id)
-                proc_values.update({
-                    'marble_height':    line.marble_height,
-                    'marble_width':     line.marble_width,
-                    'marble_sqm':       line.marble_sqm,
-                    'lot_general':      line.lot_general,
-                    'marble_thickness': line.marble_thickness,
-                    'pedimento_number': line.pedimento_number,
-                    'lot_id':           line.lot_id.id if line.lot_id else False,
-                    'sale_line_id':     line.id,
-                    'numero_contenedor': line.numero_contenedor,
-                })
-                line_with_context = line.with_context(
-                    default_group_id=group.id,
-                    force_procurement_values=proc_values
-                )
-                super(SaleOrderLine, line_with_context)._action_launch_stock_rule(previous_product_uom_qty)
-            else:
-                super(SaleOrderLine, line)._action_launch_stock_rule(previous_product_uom_qty)
-        return True
+        """
+        Lanza el abastecimiento de todas las líneas en una sola pasada, bajo el
+        grupo del pedido: todas las necesidades llegan juntas a
+        procurement.group.run (super). Los valores de mármol viajan en cada
+        procurement desde _prepare_procurement_values.
+        """
+        return super()._action_launch_stock_rule(previous_product_uom_qty)
     # --- FIN: MÉTODOS DE sale_order_line.py ---
\ No newline at end of file
@@ -1,4 +1,14 @@
-from odoo import models, fields
+import re
+
+from odoo import models, fields, api
+from odoo.osv import expression
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+# Tolerancia (cm) al comparar grosores en la búsqueda de placas
+THICKNESS_TOLERANCE = 0.05
+# Medidas escritas en el selector de lotes: "2.8x1.6", "2,80 × 1,60"
+DIMENSIONS_PATTERN = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*[x×*]\s*(\d+(?:[.,]\d+)?)\s*$', re.IGNORECASE)
 
 class StockLot(models.Model):
     _inherit = 'stock.lot'
@@ -6,6 +16,147 @@ class StockLot(models.Model):
     marble_height = fields.Float('Altura (m)')
     marble_width = fields.Float('Ancho (m)')
     marble_sqm = fields.Float('m²')
-    lot_general = fields.Char('Lote')
+    lot_general = fields.Char('Lote', index='btree_not_null')
     marble_thickness = fields.Float('Grosor (cm)')
-    numero_contenedor = fields.Char('Número de Contenedor')
+    numero_contenedor = fields.Char('Número de Contenedor', index='btree_not_null')
+    pedimento_number = fields.Char(
+        string='Número de Pedimento',
+        size=18,
+        compute='_compute_pedimento_number',
+        store=True,
+        index=True,
+        help='Pedimento del quant interno con existencias más reciente (por fecha de entrada).',
+    )
+    # Lados de la placa sin orientación, para buscar por medidas admitiendo giro
+    marble_long_side = fields.Float('Lado Mayor (m)', compute='_compute_marble_sides', store=True)
+    marble_short_side = fields.Float('Lado Menor (m)', compute='_compute_marble_sides', store=True)
+
+    def init(self):
+        super().init()
+        # Búsqueda de placas por producto, grosor y medidas mínimas
+        create_index(
+            self.env.cr, 'stock_lot_marble_slab_search_idx', self._table,
+            ['product_id', 'marble_thickness', 'marble_long_side', 'marble_short_side', 'marble_sqm'],
+            where='marble_long_side > 0',
+        )
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Los campos de mármol forman parte de la clave del resumen de m²
+        if {'marble_sqm', 'lot_general', 'marble_thickness', 'numero_contenedor'} & vals.keys():
+            self.quant_ids._marble_mark_summary_dirty()
+        return res
+
+    @api.model
+    def _search_display_name(self, operator, value):
+        """
+        El selector de lotes busca en el servidor, paginado, por número de
+        serie, bloque o contenedor, y por medidas ("2.8x1.6": placas en las que
+        cabe esa pieza en cualquier orientación).
+        """
+        domain = super()._search_display_name(operator, value)
+        if operator not in ('ilike', 'like', '=ilike', '=like', '=') or not value or not isinstance(value, str):
+            return domain
+        marble_domains = [
+            domain,
+            [('lot_general', operator, value)],
+            [('numero_contenedor', operator, value)],
+        ]
+        dimensions = DIMENSIONS_PATTERN.match(value)
+        if dimensions:
+            height, width = (float(number.replace(',', '.')) for number in dimensions.groups())
+            marble_domains.append([
+                ('marble_long_side', '>=', max(height, width)),
+                ('marble_short_side', '>=', min(height, width)),
+            ])
+        return expression.OR(marble_domains)
+
+    @api.depends('marble_height', 'marble_width')
+    def _compute_marble_sides(self):
+        for lot in self:
+            height, width = lot.marble_height or 0.0, lot.marble_width or 0.0
+            lot.marble_long_side = max(height, width)
+            lot.marble_short_side = min(height, width)
+
+    @api.model
+    def _marble_slab_domain(self, product_id, thickness=0.0, min_height=0.0, min_width=0.0):
+        """
+        Dominio de placas con existencias internas de un producto, del grosor
+        indicado y en las que cabe una pieza de min_height × min_width en
+        cualquier orientación.
+        """
+        domain = [
+            ('product_id', '=', product_id),
+            ('marble_long_side', '>=', max(min_height, min_width)),
+            ('marble_short_side', '>=', min(min_height, min_width)),
+            ('marble_long_side', '>', 0),
+            ('quant_ids', 'any', [('quantity', '>', 0), ('location_id.usage', '=', 'internal')]),
+        ]
+        if thickness:
+            domain += [
+                ('marble_thickness', '>=', thickness - THICKNESS_TOLERANCE),
+                ('marble_thickness', '<=', thickness + THICKNESS_TOLERANCE),
+            ]
+        return domain
+
+    @api.model
+    def search_available_slabs(self, product_id, thickness=0.0, min_height=0.0, min_width=0.0, limit=80, offset=0):
+        """
+        API de búsqueda de placas por medidas, ordenadas de menor a mayor
+        desperdicio (m² de la placa menos m² pedidos) y paginadas.
+
+        :return: {'total': número de placas que cumplen, 'records': [dict por placa]}
+        """
+        domain = self._marble_slab_domain(product_id, thickness, min_height, min_width)
+        slabs = self.search_fetch(
+            domain,
+            ['name', 'lot_general', 'numero_contenedor', 'marble_thickness',
+             'marble_height', 'marble_width', 'marble_sqm', 'pedimento_number'],
+            order='marble_sqm, id', limit=limit, offset=offset,
+        )
+        requested_sqm = (min_height or 0.0) * (min_width or 0.0)
+        return {
+            'total': self.search_count(domain),
+            'records': [{
+                'id': slab.id,
+                'name': slab.name,
+                'lot_general': slab.lot_general,
+                'numero_contenedor': slab.numero_contenedor,
+                'marble_thickness': slab.marble_thickness,
+                'marble_height': slab.marble_height,
+                'marble_width': slab.marble_width,
+                'marble_sqm': slab.marble_sqm,
+                'pedimento_number': slab.pedimento_number,
+                'waste_sqm': slab.marble_sqm - requested_sqm,
+            } for slab in slabs],
+        }
+
+    @api.depends('quant_ids.quantity', 'quant_ids.in_date', 'quant_ids.location_id', 'quant_ids.pedimento_number')
+    def _compute_pedimento_number(self):
+        pedimentos = self._origin._marble_resolve_pedimento_numbers()
+        for lot in self:
+            lot.pedimento_number = pedimentos.get(lot._origin.id) or ''
+
+    def _marble_resolve_pedimento_numbers(self, usages=('internal',)):
+        """
+        Devuelve {lot_id: pedimento} tomando, para cada lote, el quant con
+        cantidad > 0 en una ubicación de los tipos indicados y fecha de
+        entrada más reciente. Una sola consulta para todos los lotes.
+        """
+        if not self.ids:
+            return {}
+        self.env['stock.quant'].flush_model(['lot_id', 'quantity', 'location_id', 'in_date', 'pedimento_number'])
+        self.env['stock.location'].flush_model(['usage'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT DISTINCT ON (quant.lot_id) quant.lot_id, quant.pedimento_number
+              FROM stock_quant quant
+              JOIN stock_location location ON location.id = quant.location_id
+             WHERE quant.lot_id IN %s
+               AND quant.quantity > 0
+               AND location.usage IN %s
+          ORDER BY quant.lot_id, quant.in_date DESC
+            """,
+            tuple(self.ids), tuple(usages),
+        ))
+        return dict(self.env.cr.fetchall())
@@ -1,10 +1,25 @@
 # models/stock_move.py
 
+from collections import defaultdict
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
-import logging
 
-_logger = logging.getLogger(__name__)
+from .marble_perf_stat import instrument
+
+# Campos que se copian del move a sus líneas de operación
+MARBLE_MOVE_LINE_FIELDS = (
+    'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+    'marble_thickness', 'pedimento_number', 'numero_contenedor',
+)
+# Un write que toque alguno de estos campos obliga a propagar a las líneas
+MARBLE_PROPAGATION_TRIGGERS = frozenset(MARBLE_MOVE_LINE_FIELDS) | {'lot_id', 'move_line_ids'}
+# Un move con alguno de estos campos modificados debe sincronizarse con su lote
+MARBLE_SYNC_TRIGGERS = frozenset(MARBLE_MOVE_LINE_FIELDS) | {'lot_id'}
+# Moves pendientes de sincronizar con su lote en la transacción actual. Se
+# guardan en cr.postcommit.data, que sobrevive a los flush (savepoints) y se
+# vacía al confirmar o revertir la transacción.
+PENDING_SYNC_KEY = 'marble.moves_to_sync'
 
 class StockMove(models.Model):
     _inherit = 'stock.move'
@@ -14,11 +29,11 @@ class StockMove(models.Model):
     marble_height = fields.Float('Altura (m)')
     marble_width = fields.Float('Ancho (m)')
     marble_sqm = fields.Float('m²', compute='_compute_marble_sqm', store=True, readonly=False)
-    lot_general = fields.Char('Lote')
+    lot_general = fields.Char('Lote', index='btree_not_null')
     marble_thickness = fields.Float('Grosor (cm)')
     is_outgoing = fields.Boolean(string='Es Salida', compute='_compute_is_outgoing', store=True)
     pedimento_number = fields.Char(string='Número de Pedimento', size=18)
-    numero_contenedor = fields.Char('Número de Contenedor')
+    numero_contenedor = fields.Char('Número de Contenedor', index='btree_not_null')
 
     lot_selection_mode = fields.Selection([
         ('existing', 'Seleccionar Lote Existente'),
@@ -27,7 +42,9 @@ class StockMove(models.Model):
     existing_lot_id = fields.Many2one(
         'stock.lot',
         string='Lote Existente',
-        domain="[('product_id','=',product_id),('id','in',available_lot_ids)]"
+        # Se evalúa en el servidor al buscar (paginado), sin enviar la lista de lotes
+        domain="[('product_id', '=', product_id), "
+               "('quant_ids', 'any', [('quantity', '>', 0), ('location_id.usage', '=', 'internal')])]",
     )
     available_lot_ids = fields.Many2many(
         'stock.lot',
@@ -35,19 +52,13 @@ class StockMove(models.Model):
         string='Lotes Disponibles'
     )
 
-    @api.depends('product_id')
+    @api.depends('product_id', 'is_outgoing')
     def _compute_available_lots(self):
+        # Solo las salidas eligen lotes existentes
+        outgoing = self.filtered('is_outgoing')
+        lots_by_product = self.env['stock.quant']._marble_available_lots(outgoing.product_id)
         for move in self:
-            if move.product_id:
-                quants = self.env['stock.quant'].search([
-                    ('product_id', '=', move.product_id.id),
-                    ('quantity', '>', 0),
-                    ('location_id.usage', '=', 'internal'),
-                    ('lot_id', '!=', False),
-                ])
-                move.available_lot_ids = quants.mapped('lot_id')
-            else:
-                move.available_lot_ids = False
+            move.available_lot_ids = lots_by_product.get(move.product_id.id, False) if move.is_outgoing else False
 
     @api.onchange('lot_selection_mode')
     def _onchange_lot_selection_mode(self):
@@ -79,31 +90,27 @@ class StockMove(models.Model):
             self.lot_id = lot.id
             self.so_lot_id = lot.id
             self.numero_contenedor = lot.numero_contenedor
+            self.pedimento_number = lot.pedimento_number or ''
 
-            quant = self.env['stock.quant'].search([
-                ('lot_id', '=', lot.id),
-                ('quantity', '>', 0),
-                ('location_id.usage', '=', 'internal'),
-            ], limit=1, order='in_date DESC')
-            self.pedimento_number = quant.pedimento_number or ''
-
-            # 2. Sincroniza otras líneas del mismo picking
+            # 2. Sincroniza otras líneas del mismo picking: sus lotes (con el
+            #    pedimento ya almacenado) se leen de una sola vez
             if self.picking_id:
-                for other_move in self.picking_id.move_ids_without_package:
-                    if other_move == self._origin:
-                        continue
-                    if other_move.lot_id and other_move.marble_sqm != other_move.lot_id.marble_sqm:
-                        other_quant = self.env['stock.quant'].search([
-                            ('lot_id', '=', other_move.lot_id.id),
-                            ('quantity', '>', 0),
-                            ('location_id.usage', '=', 'internal'),
-                        ], limit=1, order='in_date DESC')
-                        other_move.lot_general = other_move.lot_id.lot_general
-                        other_move.marble_height = other_move.lot_id.marble_height
-                        other_move.marble_width = other_move.lot_id.marble_width
-                        other_move.marble_sqm = other_move.lot_id.marble_sqm
-                        other_move.marble_thickness = other_move.lot_id.marble_thickness
-                        other_move.pedimento_number = other_quant.pedimento_number or ''
+                other_moves = self.picking_id.move_ids_without_package.filtered(
+                    lambda m: m != self._origin and m.lot_id
+                )
+                other_moves.lot_id._origin.fetch([
+                    'lot_general', 'marble_height', 'marble_width', 'marble_sqm',
+                    'marble_thickness', 'pedimento_number',
+                ])
+                for other_move in other_moves:
+                    other_lot = other_move.lot_id
+                    if other_move.marble_sqm != other_lot.marble_sqm:
+                        other_move.lot_general = other_lot.lot_general
+                        other_move.marble_height = other_lot.marble_height
+                        other_move.marble_width = other_lot.marble_width
+                        other_move.marble_sqm = other_lot.marble_sqm
+                        other_move.marble_thickness = other_lot.marble_thickness
+                        other_move.pedimento_number = other_lot.pedimento_number or ''
 
     @api.depends('marble_height', 'marble_width')
     def _compute_marble_sqm(self):
@@ -116,73 +123,71 @@ class StockMove(models.Model):
             move.is_outgoing = (move.picking_type_id.code == 'outgoing')
 
     @api.model_create_multi
+    @instrument('stock.move.create')
     def create(self, vals_list):
-        """
-        Agregar logs al crear stock moves
-        """
-        _logger.info("🆕 DEBUG: StockMove.create llamado con %s moves", len(vals_list))
-        
-        for i, vals in enumerate(vals_list):
-            _logger.info("🆕 DEBUG: Move %s - Producto ID: %s, Nombre: %s", 
-                        i, vals.get('product_id'), vals.get('name'))
-            _logger.info("🆕 DEBUG: Move %s - Altura: %s, Ancho: %s, m²: %s, Lote: %s, PO Line: %s", 
-                        i, vals.get('marble_height'), vals.get('marble_width'), 
-                        vals.get('marble_sqm'), vals.get('lot_general'), vals.get('purchase_line_id'))
-        
         moves = super().create(vals_list)
-        
-        _logger.info("🆕 DEBUG: Moves creados - Total: %s", len(moves))
-        for move in moves:
-            _logger.info("🆕 DEBUG: Move creado ID: %s - Producto: %s, Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                        move.id, move.product_id.name, move.marble_height, move.marble_width, 
-                        move.marble_sqm, move.lot_general)
-        
+        if not self.env.context.get('skip_sync'):
+            moves.browse(
+                move.id for move, vals in zip(moves, vals_list)
+                if not MARBLE_SYNC_TRIGGERS.isdisjoint(vals)
+            )._marble_mark_pending_sync()
         return moves
 
+    @instrument('stock.move.write')
     def write(self, vals):
-        """
-        Agregar logs al escribir stock moves
-        """
-        if vals:
-            _logger.info("✏️ DEBUG: StockMove.write llamado para %s moves", len(self))
-            _logger.info("✏️ DEBUG: Valores a escribir: %s", vals)
-            
-            for move in self:
-                _logger.info("✏️ DEBUG: Move %s - Antes: Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                           move.id, move.marble_height, move.marble_width, move.marble_sqm, move.lot_general)
-        
-        # El write se centra en su funcionalidad principal.
         result = super().write(vals)
-        
-        if vals and any(key.startswith('marble_') or key == 'lot_general' for key in vals.keys()):
-            for move in self:
-                _logger.info("✏️ DEBUG: Move %s - Después: Altura: %s, Ancho: %s, m²: %s, Lote: %s", 
-                           move.id, move.marble_height, move.marble_width, move.marble_sqm, move.lot_general)
-        
-        if self:
+        if self and not self.env.context.get('skip_sync') and not MARBLE_SYNC_TRIGGERS.isdisjoint(vals):
+            self._marble_mark_pending_sync()
+        if self and not MARBLE_PROPAGATION_TRIGGERS.isdisjoint(vals):
             self._propagate_marble_data_to_move_lines()
         return result
 
+    def _marble_mark_pending_sync(self):
+        """Anota los moves cuyo lote o datos de mármol cambiaron en esta transacción."""
+        if self:
+            self.env.cr.postcommit.data.setdefault(PENDING_SYNC_KEY, set()).update(self.ids)
+
+    @api.model
+    def _marble_pop_pending_sync(self, pickings):
+        """Devuelve y olvida los moves pendientes de sincronizar que pertenecen a `pickings`."""
+        pending = self.env.cr.postcommit.data.get(PENDING_SYNC_KEY)
+        if not pending:
+            return self.browse()
+        moves = self.browse(pending).exists().filtered(lambda m: m.picking_id in pickings)
+        pending.difference_update(moves.ids)
+        return moves
+
     def _propagate_marble_data_to_move_lines(self):
         """
         Propaga los datos de mármol y lote a las líneas de movimiento asociadas.
+        Solo se escriben las líneas desincronizadas, con un write por cada
+        payload distinto (normalmente uno por pieza o por grupo de piezas iguales).
         """
-        for move in self:
-            if not move.exists():
+        line_ids_by_payload = defaultdict(list)
+        for move in self.exists():
+            if not move.move_line_ids:
                 continue
-            if move.move_line_ids:
-                data = {
-                    'marble_height': move.marble_height,
-                    'marble_width': move.marble_width,
-                    'marble_sqm': move.marble_sqm,
-                    'lot_general': move.lot_general,
-                    'marble_thickness': move.marble_thickness,
-                    'pedimento_number': move.pedimento_number or '',
-                    'numero_contenedor': move.numero_contenedor,
-                }
-                if move.lot_id:
-                    data['lot_id'] = move.lot_id.id
-                move.move_line_ids.write(data)
+            payload = {
+                'marble_height': move.marble_height,
+                'marble_width': move.marble_width,
+                'marble_sqm': move.marble_sqm,
+                'lot_general': move.lot_general,
+                'marble_thickness': move.marble_thickness,
+                'pedimento_number': move.pedimento_number or '',
+                'numero_contenedor': move.numero_contenedor,
+            }
+            if move.lot_id:
+                payload['lot_id'] = move.lot_id.id
+            key = tuple(payload.items())
+            for line in move.move_line_ids:
+                # Las entradas sin lote se reescriben siempre: el write genera su serie
+                pending_serial = payload['lot_general'] and not line.lot_id and line.picking_code == 'incoming'
+                if pending_serial or line._marble_differs_from(payload):
+                    line_ids_by_payload[key].append(line.id)
+
+        MoveLine = self.env['stock.move.line']
+        for key, line_ids in line_ids_by_payload.items():
+            MoveLine.browse(line_ids).write(dict(key))
 
     def _prepare_move_line_vals(self, quantity=None, reserved_quant=None):
         vals = super()._prepare_move_line_vals(quantity, reserved_quant)
@@ -200,16 +205,17 @@ class StockMove(models.Model):
         vals.update(marble_data)
         return vals
 
+    @instrument('stock.move._action_assign')
     def _action_assign(self):
         result = super()._action_assign()
-        for move in self:
-            if move.move_line_ids and (move.lot_id or move.marble_sqm or move.lot_general):
-                move._propagate_marble_data_to_move_lines()
+        self.filtered(
+            lambda m: m.move_line_ids and (m.lot_id or m.marble_sqm or m.lot_general)
+        )._propagate_marble_data_to_move_lines()
         return result
 
+    @instrument('stock.move._action_done')
     def _action_done(self, cancel_backorder=False):
-        for move in self:
-            move._propagate_marble_data_to_move_lines()
+        self._propagate_marble_data_to_move_lines()
         return super()._action_done(cancel_backorder=cancel_backorder)
 
     # ===== MÉTODOS PARA PREVENIR AGRUPACIÓN =====
@@ -221,6 +227,7 @@ class StockMove(models.Model):
         result = super()._search_picking_for_assignation()
         return result
 
+    @instrument('stock.move._key_assign_picking')
     def _key_assign_picking(self):
         """
         Sobrescribir la clave de agrupación para incluir datos de mármol
@@ -236,10 +243,7 @@ class StockMove(models.Model):
             self.numero_contenedor or '',
             self.purchase_line_id.id if self.purchase_line_id else 0,
         )
-        
-        final_key = key + marble_key
-        _logger.info("🔑 DEBUG: _key_assign_picking para move %s - Clave: %s", self.id, final_key)
-        return final_key
+        return key + marble_key
 
     @api.model 
     def _prepare_merge_moves_distinct_fields(self):
@@ -282,12 +286,11 @@ class StockMove(models.Model):
             return True
         return result
 
+    @instrument('stock.move._merge_moves')
     def _merge_moves(self, merge_into=False):
         """
         Prevenir merge de moves con diferentes características de mármol
         """
-        _logger.info("🔄 DEBUG: _merge_moves llamado para %s moves", len(self))
-        
         # Agrupar moves por sus características de mármol
         marble_groups = {}
         for move in self:
@@ -303,22 +306,12 @@ class StockMove(models.Model):
             if marble_key not in marble_groups:
                 marble_groups[marble_key] = self.env['stock.move']
             marble_groups[marble_key] |= move
-            
-            _logger.info("🔄 DEBUG: Move %s agrupado con clave: %s", move.id, marble_key)
-
-        _logger.info("🔄 DEBUG: Grupos de mármol creados: %s", len(marble_groups))
 
         # Solo hacer merge dentro de cada grupo con las mismas características
         merged_moves = self.env['stock.move']
-        for i, (marble_key, group_moves) in enumerate(marble_groups.items()):
-            _logger.info("🔄 DEBUG: Procesando grupo %s con %s moves", i, len(group_moves))
-            
+        for group_moves in marble_groups.values():
             if len(group_moves) > 1:
-                _logger.info("🔄 DEBUG: Haciendo merge de grupo %s", i)
                 merged_moves |= super(StockMove, group_moves)._merge_moves(merge_into)
             else:
-                _logger.info("🔄 DEBUG: Grupo %s no necesita merge", i)
                 merged_moves |= group_moves
-
-        _logger.info("🔄 DEBUG: Moves después del merge: %s", len(merged_moves))
-        return merged_moves
\ No newline at end of file
+        return merged_moves
@@ -1,83 +1,104 @@
 # models/stock_move_line.py
 
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .marble_perf_stat import instrument
+
 class StockMoveLine(models.Model):
     _inherit = 'stock.move.line'
 
     marble_height = fields.Float('Altura (m)')
     marble_width = fields.Float('Ancho (m)')
     marble_sqm = fields.Float('m²', compute='_compute_marble_sqm', store=True, readonly=False)
-    lot_general = fields.Char('Lote')
+    lot_general = fields.Char('Lote', index='btree_not_null')
     marble_thickness = fields.Float('Grosor (cm)')
-    numero_contenedor = fields.Char('Número de Contenedor')
+    numero_contenedor = fields.Char('Número de Contenedor', index='btree_not_null')
 
     @api.depends('marble_height', 'marble_width')
     def _compute_marble_sqm(self):
         for line in self:
             line.marble_sqm = (line.marble_height or 0.0) * (line.marble_width or 0.0)
 
+    def _marble_differs_from(self, payload):
+        """Indica si la línea no refleja ya los valores de `payload`."""
+        self.ensure_one()
+        for field_name, value in payload.items():
+            current = self[field_name]
+            if isinstance(current, models.BaseModel):
+                current = current.id
+            if (current or False) != (value or False):
+                return True
+        return False
+
     @api.model_create_multi
+    @instrument('stock.move.line.create')
     def create(self, vals_list):
-        Lot = self.env['stock.lot']
-        Seq = self.env['ir.sequence'].sudo()
+        # Solo para entradas sin lot_id pero con lot_general definido
+        candidates = [vals for vals in vals_list if vals.get('lot_general') and not vals.get('lot_id')]
+        if candidates:
+            moves = self.env['stock.move'].browse({
+                vals['move_id'] for vals in candidates
+                if not vals.get('picking_code') and vals.get('move_id')
+            })
+            move_codes = {move.id: move.picking_type_id.code for move in moves}
+            incoming = [
+                vals for vals in candidates
+                if (vals.get('picking_code') or move_codes.get(vals.get('move_id'))) == 'incoming'
+            ]
+            if incoming:
+                self._marble_generate_lots(incoming)
 
+        return super().create(vals_list)
+
+    @api.model
+    def _marble_generate_lots(self, vals_list):
+        """
+        Genera los números de serie y los lotes de todas las entradas de
+        vals_list: una reserva atómica de N series por bloque (marble.block) y
+        un único create de stock.lot. Asigna lot_id en cada diccionario.
+        """
+        vals_by_block = defaultdict(list)
         for vals in vals_list:
-            # Solo para entradas sin lot_id pero con lot_general definido
-            if vals.get('lot_general') and not vals.get('lot_id'):
-                picking_code = vals.get('picking_code')
-                if not picking_code and vals.get('move_id'):
-                    move = self.env['stock.move'].browse(vals['move_id'])
-                    picking_code = move.picking_type_id.code
-                if picking_code == 'incoming':
-                    lot_general = vals['lot_general']
-                    seq_code = f"marble.serial.{lot_general}"
-                    sequence = Seq.search([('code', '=', seq_code)], limit=1)
-                    if not sequence:
-                        sequence = Seq.create({
-                            'name': _('Secuencia Mármol %s') % lot_general,
-                            'code': seq_code,
-                            'padding': 3,
-                            'prefix': f"{lot_general}-",
-                        })
-                    lot_name = sequence.next_by_id()
-                    new_lot = Lot.create({
-                        'name': lot_name,
-                        'product_id': vals.get('product_id'),
-                        'company_id': vals.get('company_id'),
-                        'marble_height': vals.get('marble_height'),
-                        'marble_width': vals.get('marble_width'),
-                        'numero_contenedor': vals.get('numero_contenedor', ''),
-                        'marble_sqm': (vals.get('marble_height') or 0.0) * (vals.get('marble_width') or 0.0),
-                        'lot_general': lot_general,
-                        'marble_thickness': vals.get('marble_thickness', 0.0),
-                    })
-                    vals['lot_id'] = new_lot.id
+            vals_by_block[vals['lot_general']].append(vals)
 
-        return super().create(vals_list)
+        serials = self.env['marble.block']._allocate_serials({
+            lot_general: len(block_vals) for lot_general, block_vals in vals_by_block.items()
+        })
+        ordered_vals = []
+        lot_vals_list = []
+        for lot_general, block_vals in vals_by_block.items():
+            for vals, lot_name in zip(block_vals, serials[lot_general]):
+                ordered_vals.append(vals)
+                lot_vals_list.append({
+                    'name': lot_name,
+                    'product_id': vals.get('product_id'),
+                    'company_id': vals.get('company_id'),
+                    'marble_height': vals.get('marble_height'),
+                    'marble_width': vals.get('marble_width'),
+                    'numero_contenedor': vals.get('numero_contenedor', ''),
+                    'marble_sqm': (vals.get('marble_height') or 0.0) * (vals.get('marble_width') or 0.0),
+                    'lot_general': lot_general,
+                    'marble_thickness': vals.get('marble_thickness', 0.0),
+                })
+
+        lots = self.env['stock.lot'].create(lot_vals_list)
+        for vals, lot in zip(ordered_vals, lots):
+            vals['lot_id'] = lot.id
 
+    @instrument('stock.move.line.write')
     def write(self, vals):
         if 'lot_general' not in vals or not vals['lot_general']:
             return super().write(vals)
 
-        Lot = self.env['stock.lot']
-        Seq = self.env['ir.sequence'].sudo()
         to_process = self.filtered(lambda l: not l.lot_id and l.picking_id.picking_type_id.code == 'incoming')
-
-        for line in to_process:
+        new_lot_by_line = {}
+        if to_process:
             lot_general = vals['lot_general']
-            seq_code = f"marble.serial.{lot_general}"
-            sequence = Seq.search([('code', '=', seq_code)], limit=1)
-            if not sequence:
-                sequence = Seq.create({
-                    'name': _('Secuencia Mármol %s') % lot_general,
-                    'code': seq_code,
-                    'padding': 3,
-                    'prefix': f"{lot_general}-",
-                })
-            lot_name = sequence.next_by_id()
-            new_lot = Lot.create({
+            lot_names = self.env['marble.block']._allocate_serials({lot_general: len(to_process)})[lot_general]
+            lots = self.env['stock.lot'].create([{
                 'name': lot_name,
                 'product_id': vals.get('product_id', line.product_id.id),
                 'company_id': line.company_id.id,
@@ -87,14 +108,22 @@ class StockMoveLine(models.Model):
                 'lot_general': lot_general,
                 'marble_thickness': vals.get('marble_thickness', line.marble_thickness),
                 'numero_contenedor': vals.get('numero_contenedor', line.numero_contenedor),
-            })
-            update_vals = vals.copy()
-            update_vals['lot_id'] = new_lot.id
-            super(StockMoveLine, line).write(update_vals)
+            } for line, lot_name in zip(to_process, lot_names)])
+            new_lot_by_line = dict(zip(to_process.ids, lots.ids))
+
+        # Agrupar por el payload final: las líneas que ya tenían lote comparten
+        # `vals`; las nuevas llevan además su lot_id. Las líneas sin lote que no
+        # son de entrada no se escriben.
+        line_ids_by_lot = defaultdict(list)
+        for line in self:
+            if line.id in new_lot_by_line:
+                line_ids_by_lot[new_lot_by_line[line.id]].append(line.id)
+            elif line.lot_id:
+                line_ids_by_lot[False].append(line.id)
 
-        with_lot = self.filtered(lambda l: l.lot_id)
-        if with_lot:
-            super(StockMoveLine, with_lot).write(vals)
+        for lot_id, line_ids in line_ids_by_lot.items():
+            payload = dict(vals, lot_id=lot_id) if lot_id else vals
+            super(StockMoveLine, self.browse(line_ids)).write(payload)
 
         return True
 
@@ -1,116 +1,154 @@
 # models/stock_picking.py
 
+from collections import defaultdict
+
 from odoo import models, api, fields
 
+from .marble_perf_stat import instrument
+
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
 
-    def _sync_moves_with_lots(self):
+    def _sync_moves_with_lots(self, moves=None):
         """
         Función clave para asegurar la coherencia de datos.
-        Itera sobre todos los movimientos y fuerza que sus datos de mármol
-        reflejen los del lote que tienen asignado.
+        Fuerza que los datos de mármol de los movimientos reflejen los del lote
+        que tienen asignado (todos los del albarán, o solo `moves`).
         Esto previene la propagación de datos incorrectos (ej. dimensiones cero).
+
+        La comparación se hace sobre el conjunto: los lotes se leen de una vez
+        y las correcciones se escriben agrupadas por payload.
         """
-        for move in self.move_ids_without_package:
-            # Condición 1: El movimiento tiene un lote asignado.
-            # Condición 2: Los m² del movimiento no coinciden con los m² del lote
-            # o el pedimento no coincide (indicador de desincronización).
-            if move.lot_id and (
-                move.marble_sqm != move.lot_id.marble_sqm or
-                (hasattr(move, 'pedimento_number') and hasattr(move.lot_id, 'pedimento_number') and move.pedimento_number != move.lot_id.pedimento_number)
-            ):
-                # Se obtienen los datos del quant para el número de pedimento
-                quant = self.env['stock.quant'].search([
-                    ('lot_id', '=', move.lot_id.id),
-                    ('quantity', '>', 0),
-                    ('location_id.usage', '=', 'internal'),
-                ], limit=1, order='in_date DESC')
-
-                # Actualizar el movimiento para que refleje los datos correctos de su lote.
-                move.with_context(skip_sync=True).write({
-                    'marble_height':    move.lot_id.marble_height,
-                    'marble_width':     move.lot_id.marble_width,
-                    'marble_sqm':       move.lot_id.marble_sqm,
-                    'lot_general':      move.lot_id.lot_general,
-                    'marble_thickness': move.lot_id.marble_thickness,
-                    'pedimento_number': quant.pedimento_number or '',
-                    'numero_contenedor': move.lot_id.numero_contenedor,
-
-                })
+        if moves is None:
+            moves = self.move_ids_without_package
+        move_ids_by_payload = defaultdict(list)
+        for move in moves.filtered('lot_id'):
+            lot = move.lot_id
+            # Desincronizado si no coinciden los m² o el pedimento
+            if (move.marble_sqm != lot.marble_sqm
+                    or (move.pedimento_number or '') != (lot.pedimento_number or '')):
+                payload = (
+                    ('marble_height', lot.marble_height),
+                    ('marble_width', lot.marble_width),
+                    ('marble_sqm', lot.marble_sqm),
+                    ('lot_general', lot.lot_general),
+                    ('marble_thickness', lot.marble_thickness),
+                    ('pedimento_number', lot.pedimento_number or ''),
+                    ('numero_contenedor', lot.numero_contenedor),
+                )
+                move_ids_by_payload[payload].append(move.id)
+
+        # Actualizar los movimientos para que reflejen los datos correctos de su lote.
+        Move = self.env['stock.move'].with_context(skip_sync=True)
+        for payload, move_ids in move_ids_by_payload.items():
+            Move.browse(move_ids).write(dict(payload))
 
+    def action_open_container_receipt(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Recibir Contenedor',
+            'res_model': 'marble.container.receipt',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_picking_id': self.id},
+        }
+
+    @instrument('stock.picking.write')
     def write(self, vals):
         """
         Sobrescribimos write para ejecutar la sincronización al guardar.
         Esto mejora la experiencia de usuario, evitando "reseteos" visuales.
+        Solo se sincronizan los movimientos cuyo lote o datos de mármol se
+        modificaron en la transacción (p. ej. líneas nuevas o editadas).
         """
-        # Primero, ejecutar el write original
         res = super().write(vals)
-        # Después de cualquier escritura, ejecutar la sincronización.
-        # Esto es especialmente útil después de añadir nuevas líneas.
-        if self.state not in ('done', 'cancel'):
-            for picking in self:
-                picking._sync_moves_with_lots()
+        pickings = self.filtered(lambda p: p.state not in ('done', 'cancel'))
+        if pickings:
+            moves = self.env['stock.move']._marble_pop_pending_sync(pickings)
+            if moves:
+                pickings._sync_moves_with_lots(moves)
         return res
 
+    @instrument('stock.picking.button_validate')
     def button_validate(self):
+        """
+        Preparación de mármol para uno o varios albaranes a la vez: los pasos
+        se ejecutan una sola vez sobre el conjunto de movimientos, con lotes y
+        líneas de venta precargados.
+        """
+        moves = self.move_ids_without_package
+        moves.fetch(['lot_id', 'sale_line_id', 'picking_type_id', 'marble_sqm', 'pedimento_number'])
+        moves.lot_id.fetch([
+            'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+            'marble_thickness', 'numero_contenedor', 'pedimento_number',
+        ])
+
         # --- PASO 1: Sincronización Forzada y Preventiva ---
-        self._sync_moves_with_lots()
-        
+        self._sync_moves_with_lots(moves)
+
         # --- PASO 2: Sincronización opcional desde la Venta (si el move está vacío) ---
-        if self.picking_type_id.code == 'outgoing':
-            for move in self.move_ids_without_package:
-                if move.sale_line_id and not move.lot_id and not move.marble_sqm > 0:
-                    sale = move.sale_line_id
-                    if sale.marble_sqm > 0 or sale.lot_id:
-                        move.write({
-                            'marble_height':    sale.marble_height,
-                            'marble_width':     sale.marble_width,
-                            'marble_sqm':       sale.marble_sqm,
-                            'lot_general':      sale.lot_general,
-                            'marble_thickness': sale.marble_thickness,
-                            'pedimento_number': sale.pedimento_number,
-                            'lot_id':           sale.lot_id.id,
-                            'numero_contenedor': sale.numero_contenedor,
-                        })
+        to_backfill = moves.filtered(
+            lambda m: m.picking_type_id.code == 'outgoing'
+            and m.sale_line_id and not m.lot_id and not m.marble_sqm > 0
+        )
+        to_backfill.sale_line_id.fetch([
+            'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+            'marble_thickness', 'pedimento_number', 'lot_id', 'numero_contenedor',
+        ])
+        move_ids_by_payload = defaultdict(list)
+        for move in to_backfill:
+            sale = move.sale_line_id
+            if sale.marble_sqm > 0 or sale.lot_id:
+                payload = (
+                    ('marble_height', sale.marble_height),
+                    ('marble_width', sale.marble_width),
+                    ('marble_sqm', sale.marble_sqm),
+                    ('lot_general', sale.lot_general),
+                    ('marble_thickness', sale.marble_thickness),
+                    ('pedimento_number', sale.pedimento_number),
+                    ('lot_id', sale.lot_id.id),
+                    ('numero_contenedor', sale.numero_contenedor),
+                )
+                move_ids_by_payload[payload].append(move.id)
+        for payload, move_ids in move_ids_by_payload.items():
+            self.env['stock.move'].browse(move_ids).write(dict(payload))
 
         # --- PASO 3: Propagación Final a las Líneas de Operación ---
-        for move in self.move_ids_without_package:
-            if move.lot_id or move.marble_sqm > 0:
-                move._propagate_marble_data_to_move_lines()
+        moves.filtered(lambda m: m.lot_id or m.marble_sqm > 0)._propagate_marble_data_to_move_lines()
 
-        result = super().button_validate()
-        return result
+        return super().button_validate()
 
+    @instrument('stock.picking._action_done')
     def _action_done(self):
-        # Como red de seguridad final, volvemos a sincronizar y corregir.
-        for line in self.move_line_ids.filtered(lambda l: l.lot_id and l.quantity > 0):
+        # Como red de seguridad final, volvemos a sincronizar y corregir,
+        # comparando todas las líneas con sus lotes en bloque.
+        lot_fields = [
+            'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+            'marble_thickness', 'numero_contenedor',
+        ]
+        lines = self.move_line_ids.filtered(lambda l: l.lot_id and l.quantity > 0)
+        lines.fetch(lot_fields + ['pedimento_number'])
+        lines.lot_id.fetch(lot_fields + ['pedimento_number'])
+
+        line_ids_by_payload = defaultdict(list)
+        for line in lines:
             lot = line.lot_id
-            
-            expected_data = {
-                'marble_height': lot.marble_height,
-                'marble_width': lot.marble_width,
-                'marble_sqm': lot.marble_sqm,
-                'lot_general': lot.lot_general,
-                'marble_thickness': lot.marble_thickness,
-                'numero_contenedor': lot.numero_contenedor,
-            }
-            
-            # Buscamos el pedimento del quant correspondiente
-            quant = self.env['stock.quant'].search([
-                ('lot_id', '=', lot.id), ('quantity', '>', 0), ('location_id.usage', '=', 'internal'),
-            ], limit=1, order='in_date DESC')
-            if quant:
-                expected_data['pedimento_number'] = quant.pedimento_number or ''
-
-            # Creamos un diccionario con los datos a verificar/actualizar
-            data_to_write = {}
-            for field, value in expected_data.items():
-                if getattr(line, field) != value:
-                    data_to_write[field] = value
-
-            if data_to_write:
-                line.write(data_to_write)
-        
-        result = super()._action_done()
-        return result
+            expected_data = {field: lot[field] for field in lot_fields}
+            # Pedimento vigente del lote (solo si tiene existencias internas)
+            if lot.pedimento_number:
+                expected_data['pedimento_number'] = lot.pedimento_number
+
+            # Solo los campos que difieren forman el payload de la línea
+            payload = tuple(
+                (field, value) for field, value in expected_data.items()
+                if line[field] != value
+            )
+            if payload:
+                line_ids_by_payload[payload].append(line.id)
+
+        MoveLine = self.env['stock.move.line']
+        for payload, line_ids in line_ids_by_payload.items():
+            MoveLine.browse(line_ids).write(dict(payload))
+
+        return super()._action_done()
@@ -1,4 +1,9 @@
-from odoo import models, fields
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+# Clave de la caché transaccional de lotes disponibles: {(company_ids, product_id): (lot_id, ...)}
+AVAILABLE_LOTS_CACHE_KEY = 'marble.available_lots'
+
 
 class StockQuant(models.Model):
     _inherit = 'stock.quant'
@@ -6,6 +11,99 @@ class StockQuant(models.Model):
     marble_height = fields.Float('Altura (m)', related='lot_id.marble_height', store=True)
     marble_width = fields.Float('Ancho (m)', related='lot_id.marble_width', store=True)
     marble_sqm = fields.Float('m²', related='lot_id.marble_sqm', store=True)
-    lot_general = fields.Char('Lote', related='lot_id.lot_general', store=True)
+    lot_general = fields.Char('Lote', related='lot_id.lot_general', store=True, index='btree_not_null')
     marble_thickness = fields.Float('Grosor (cm)', related='lot_id.marble_thickness', store=True)
-    numero_contenedor = fields.Char('Número de Contenedor', related='lot_id.numero_contenedor', store=True)
+    numero_contenedor = fields.Char('Número de Contenedor', related='lot_id.numero_contenedor', store=True, index='btree_not_null')
+
+    def init(self):
+        super().init()
+        # Pedimento vigente: quants con existencias de un lote, por fecha de entrada
+        create_index(
+            self.env.cr, 'stock_quant_marble_lot_in_date_idx', self._table,
+            ['lot_id', 'in_date DESC'], where='quantity > 0',
+        )
+        # Lotes disponibles por producto
+        create_index(
+            self.env.cr, 'stock_quant_marble_product_lot_idx', self._table,
+            ['product_id', 'lot_id'], where='quantity > 0 AND lot_id IS NOT NULL',
+        )
+        # Agregados de m² por producto, bloque, grosor y contenedor
+        create_index(
+            self.env.cr, 'stock_quant_marble_dimensions_idx', self._table,
+            ['product_id', 'lot_general', 'marble_thickness', 'numero_contenedor'],
+            where='lot_general IS NOT NULL',
+        )
+
+    @api.model
+    def _marble_available_lots(self, products):
+        """
+        Devuelve {product_id: stock.lot} con los lotes que tienen stock en
+        ubicaciones internas de las compañías activas (env.companies). Los
+        productos que no están en caché se resuelven juntos en una sola
+        consulta agrupada.
+
+        La caché se guarda en cr.precommit.data con clave (compañías, producto)
+        y se invalida por producto cuando cambian las cantidades de sus quants.
+        Es solo una caché: cada flush del cursor (commit, rollback y los
+        savepoints que hacen flush) la vacía y la siguiente llamada vuelve a
+        consultar.
+        """
+        cache = self.env.cr.precommit.data.setdefault(AVAILABLE_LOTS_CACHE_KEY, {})
+        company_ids = tuple(sorted(self.env.companies.ids))
+        missing = [pid for pid in products.ids if (company_ids, pid) not in cache]
+        if missing:
+            groups = self._read_group(
+                [
+                    ('product_id', 'in', missing),
+                    ('company_id', 'in', list(company_ids)),
+                    ('quantity', '>', 0),
+                    ('location_id.usage', '=', 'internal'),
+                    ('lot_id', '!=', False),
+                ],
+                groupby=['product_id'],
+                aggregates=['lot_id:array_agg'],
+            )
+            found = {product.id: lot_ids for product, lot_ids in groups}
+            for product_id in missing:
+                cache[(company_ids, product_id)] = tuple(dict.fromkeys(found.get(product_id) or ()))
+
+        Lot = self.env['stock.lot']
+        return {pid: Lot.browse(cache[(company_ids, pid)]) for pid in products.ids}
+
+    def _marble_invalidate_available_lots(self):
+        """Descarta de la caché los productos de estos quants."""
+        cache = self.env.cr.precommit.data.get(AVAILABLE_LOTS_CACHE_KEY)
+        if not cache:
+            return
+        product_ids = set(self.product_id.ids)
+        for key in [key for key in cache if key[1] in product_ids]:
+            del cache[key]
+
+    def _marble_mark_summary_dirty(self):
+        """Programa el recálculo del resumen de m² para los pares producto/ubicación de estos quants."""
+        self.env['marble.stock.summary']._mark_dirty(
+            (quant.product_id.id, quant.location_id.id) for quant in self
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        quants = super().create(vals_list)
+        quants._marble_invalidate_available_lots()
+        quants._marble_mark_summary_dirty()
+        return quants
+
+    def write(self, vals):
+        if {'product_id', 'lot_id', 'location_id'} & vals.keys():
+            self._marble_invalidate_available_lots()
+            self._marble_mark_summary_dirty()
+        res = super().write(vals)
+        if {'quantity', 'product_id', 'lot_id', 'location_id'} & vals.keys():
+            self._marble_invalidate_available_lots()
+        if {'quantity', 'reserved_quantity', 'product_id', 'lot_id', 'location_id'} & vals.keys():
+            self._marble_mark_summary_dirty()
+        return res
+
+    def unlink(self):
+        self._marble_invalidate_available_lots()
+        self._marble_mark_summary_dirty()
+        return super().unlink()
@@ -1,10 +1,63 @@
 # models/stock_rule.py
 
-from odoo import models
+from odoo import models, api
+
+# Clave en los values del procurement con la foto de su línea de venta
+SALE_LINE_SNAPSHOT_KEY = 'marble_sale_line_data'
+
+SALE_LINE_MARBLE_FIELDS = [
+    'marble_height', 'marble_width', 'marble_sqm', 'lot_general',
+    'pedimento_number', 'marble_thickness', 'numero_contenedor', 'lot_id',
+]
 
 class StockRule(models.Model):
     _inherit = 'stock.rule'
 
+    @api.model
+    def _run_pull(self, procurements):
+        # Leer de una vez los datos de mármol de todas las líneas de venta
+        # referenciadas, antes del bucle de reglas.
+        sale_line_ids = {
+            procurement.values['sale_line_id']
+            for procurement, rule in procurements
+            if procurement.values.get('sale_line_id')
+        }
+        if sale_line_ids:
+            snapshot = self._get_sale_line_marble_snapshot(sale_line_ids)
+            for procurement, rule in procurements:
+                sale_line_id = procurement.values.get('sale_line_id')
+                if sale_line_id:
+                    procurement.values[SALE_LINE_SNAPSHOT_KEY] = snapshot.get(sale_line_id)
+        return super()._run_pull(procurements)
+
+    @api.model
+    def _get_sale_line_marble_snapshot(self, sale_line_ids):
+        """
+        Devuelve {sale_line_id: valores de mármol para el stock.move} con una
+        sola consulta. Las líneas que ya no existen no aparecen.
+        """
+        sale_lines = self.env['sale.order.line'].search_fetch(
+            [('id', 'in', list(sale_line_ids))], SALE_LINE_MARBLE_FIELDS,
+        )
+        snapshot = {}
+        for sale_line in sale_lines:
+            marble_data = {
+                'marble_height':    sale_line.marble_height,
+                'marble_width':     sale_line.marble_width,
+                'marble_sqm':       sale_line.marble_sqm,
+                'lot_general':      sale_line.lot_general,
+                'pedimento_number': sale_line.pedimento_number,
+                'marble_thickness': sale_line.marble_thickness,
+                'numero_contenedor': sale_line.numero_contenedor,
+            }
+            if sale_line.lot_id:
+                marble_data.update({
+                    'so_lot_id': sale_line.lot_id.id,
+                    'lot_id':    sale_line.lot_id.id,
+                })
+            snapshot[sale_line.id] = marble_data
+        return snapshot
+
     def _get_stock_move_values(
         self, product_id, product_qty, product_uom, location_id,
         name, origin, company_id, values
@@ -16,22 +69,11 @@ class StockRule(models.Model):
 
         sale_line_id = values.get('sale_line_id')
         if sale_line_id:
-            sale_line = self.env['sale.order.line'].browse(sale_line_id)
-            if sale_line.exists():
-                marble_data = {
-                    'marble_height':    sale_line.marble_height,
-                    'marble_width':     sale_line.marble_width,
-                    'marble_sqm':       sale_line.marble_sqm,
-                    'lot_general':      sale_line.lot_general,
-                    'pedimento_number': sale_line.pedimento_number,
-                    'marble_thickness': sale_line.marble_thickness,
-                    'numero_contenedor': sale_line.numero_contenedor,
-                }
-                if sale_line.lot_id:
-                    marble_data.update({
-                        'so_lot_id': sale_line.lot_id.id,
-                        'lot_id':    sale_line.lot_id.id,
-                    })
+            if SALE_LINE_SNAPSHOT_KEY in values:
+                marble_data = values[SALE_LINE_SNAPSHOT_KEY]
+            else:
+                marble_data = self._get_sale_line_marble_snapshot([sale_line_id]).get(sale_line_id)
+            if marble_data:
                 res.update(marble_data)
         else:
             marble_data = {
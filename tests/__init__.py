@@ -0,0 +1,7 @@
+from . import test_query_plans
+from . import test_marble_benchmark
+from . import test_pending_sync
+from . import test_procurement_groups
+from . import test_packing_list_import
+from . import test_container_receipt
+from . import test_sale_pedimento
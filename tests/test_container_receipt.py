@@ -0,0 +1,58 @@
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMarbleContainerReceipt(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.product = cls.env['product.product'].create({
+            'name': 'Mármol Contenedor',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+        })
+        purchase = cls.env['purchase.order'].create({
+            'partner_id': cls.env['res.partner'].create({'name': 'Cantera'}).id,
+            'order_line': [Command.create({
+                'product_id': cls.product.id,
+                'product_qty': 1.0,
+                'price_unit': 100.0,
+                'marble_height': height,
+                'marble_width': 1.6,
+                'marble_thickness': 2.0,
+                'lot_general': 'REC-B1',
+                'numero_contenedor': 'CONT-REC',
+            }) for height in (2.8, 3.0)],
+        })
+        purchase.button_confirm()
+        cls.picking = purchase.picking_ids
+
+    def _open_wizard(self):
+        return self.env['marble.container.receipt'].with_context(
+            default_picking_id=self.picking.id,
+        ).create({})
+
+    def test_running_twice_does_not_duplicate(self):
+        first = self._open_wizard()
+        self.assertEqual(len(first.line_ids), 2)
+        # Primera pasada: solo la primera placa
+        first.line_ids[1].unlink()
+        first.action_confirm()
+
+        second = self._open_wizard()
+        self.assertEqual(len(second.line_ids), 1)
+        self.assertEqual(second.line_ids.marble_height, 3.0)
+        second.action_confirm()
+
+        lot_lines = self.picking.move_line_ids.filtered('lot_id')
+        self.assertEqual(len(lot_lines), 2)
+        self.assertTrue(all(lot_lines.mapped('picked')))
+        for move in self.picking.move_ids:
+            self.assertEqual(len(move.move_line_ids), 1)
+        self.assertEqual(self.env['stock.lot'].search_count([('lot_general', '=', 'REC-B1')]), 2)
+
+        # Nada pendiente: una tercera pasada no trae filas
+        self.assertFalse(self._open_wizard().line_ids)
@@ -0,0 +1,163 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+# Tamaños del contenedor (número de placas) para cada corrida
+BENCHMARK_SIZES = (10, 100, 500)
+# Corrida anterior (JSON de este mismo benchmark) contra la que se comparan
+# las consultas; sin ella el benchmark solo mide y registra
+BASELINE_ENV = 'MARBLE_BENCHMARK_BASELINE'
+# Margen de consultas sobre la corrida anterior antes de darlo por regresión
+BASELINE_TOLERANCE = 0.10
+# Salida JSON para comparar corridas (por defecto en el directorio temporal)
+OUTPUT_ENV = 'MARBLE_BENCHMARK_OUTPUT'
+OUTPUT_FILENAME = 'marble_benchmark.json'
+
+
+@tagged('post_install', '-at_install', '-standard', 'marble_benchmark')
+class TestMarbleBenchmark(TransactionCase):
+    """
+    Tiempos y consultas SQL de los flujos principales de mármol para
+    contenedores de 10, 100 y 500 placas. No forma parte de la batería
+    estándar; se ejecuta con --test-tags marble_benchmark. Con
+    MARBLE_BENCHMARK_BASELINE apuntando al JSON de una corrida anterior,
+    falla si algún flujo hace más consultas que entonces.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.vendor = cls.env['res.partner'].create({'name': 'Cantera Benchmark'})
+        cls.customer = cls.env['res.partner'].create({'name': 'Cliente Benchmark'})
+        cls.results = []
+
+    def _create_product(self, n):
+        return self.env['product.product'].create({
+            'name': f'Mármol Benchmark {n}',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+            'seller_ids': [Command.create({'partner_id': self.vendor.id, 'price': 100.0})],
+        })
+
+    def _measure(self, flow, n, func):
+        """Ejecuta `func` y registra tiempo y consultas, incluidas las de flush y precommit."""
+        cr = self.env.cr
+        self.env.flush_all()
+        queries = cr.sql_log_count
+        start = time.perf_counter()
+        result = func()
+        self.env.flush_all()
+        cr.precommit.run()
+        elapsed = time.perf_counter() - start
+        query_count = cr.sql_log_count - queries
+        self.results.append({
+            'flow': flow,
+            'n': n,
+            'queries': query_count,
+            'seconds': round(elapsed, 4),
+        })
+        return result
+
+    def _validate(self, pickings):
+        pickings.move_ids.picked = True
+        return pickings.with_context(skip_backorder=True, skip_sms=True).button_validate()
+
+    def _run_flows(self, n):
+        product = self._create_product(n)
+
+        # 1. Confirmación de la compra: una línea por placa, bloques de 25 placas
+        purchase = self.env['purchase.order'].create({
+            'partner_id': self.vendor.id,
+            'order_line': [Command.create({
+                'product_id': product.id,
+                'product_qty': 1.0,
+                'price_unit': 100.0,
+                'marble_height': 2.8 + (i % 7) * 0.05,
+                'marble_width': 1.6 + (i % 5) * 0.05,
+                'marble_thickness': 2.0,
+                'lot_general': f'BENCH{n}-B{i // 25}',
+                'numero_contenedor': f'CONT-{n}',
+            }) for i in range(n)],
+        })
+        self._measure('purchase_confirm', n, purchase.button_confirm)
+
+        # 2. Validación de la recepción del contenedor
+        receipt = purchase.picking_ids
+        self._measure('receipt_validate', n, lambda: self._validate(receipt))
+        lots = receipt.move_line_ids.lot_id
+        self.assertEqual(len(lots), n, "Cada placa recibida debe tener su número de serie")
+
+        # 3. Confirmación de la venta con lote por línea
+        sale = self.env['sale.order'].create({
+            'partner_id': self.customer.id,
+            'order_line': [Command.create({
+                'product_id': product.id,
+                'product_uom_qty': 1.0,
+                'lot_id': lot.id,
+                'marble_height': lot.marble_height,
+                'marble_width': lot.marble_width,
+                'marble_thickness': lot.marble_thickness,
+                'lot_general': lot.lot_general,
+                'numero_contenedor': lot.numero_contenedor,
+            }) for lot in lots],
+        })
+        self._measure('sale_confirm', n, sale.action_confirm)
+
+        # 4. Validación de la entrega
+        delivery = sale.picking_ids
+        self._measure('delivery_validate', n, lambda: self._validate(delivery))
+        self.assertEqual(delivery.state, 'done')
+
+        # 5. Cancelación de una venta confirmada (sin existencias: sin lote)
+        to_cancel = self.env['sale.order'].create({
+            'partner_id': self.customer.id,
+            'order_line': [Command.create({
+                'product_id': product.id,
+                'product_uom_qty': 1.0,
+            }) for __ in range(n)],
+        })
+        to_cancel.action_confirm()
+        self._measure('sale_cancel', n, to_cancel.action_cancel)
+        self.assertEqual(to_cancel.state, 'cancel')
+
+    def _write_results(self):
+        path = os.environ.get(OUTPUT_ENV) or os.path.join(tempfile.gettempdir(), OUTPUT_FILENAME)
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump({
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'database': self.env.cr.dbname,
+                'results': self.results,
+            }, output, indent=2)
+        return path
+
+    def _read_baseline(self):
+        """{(flujo, N): consultas} de la corrida de referencia, si se indicó."""
+        path = os.environ.get(BASELINE_ENV)
+        if not path:
+            return {}
+        with open(path, encoding='utf-8') as baseline:
+            return {(r['flow'], r['n']): r['queries'] for r in json.load(baseline)['results']}
+
+    def test_marble_flows(self):
+        # Leída antes de escribir: la referencia puede ser el mismo archivo de salida
+        baseline = self._read_baseline()
+        for n in BENCHMARK_SIZES:
+            self._run_flows(n)
+        self._write_results()
+
+        for result in self.results:
+            key = (result['flow'], result['n'])
+            if key not in baseline:
+                continue
+            with self.subTest(flow=result['flow'], n=result['n']):
+                self.assertLessEqual(
+                    result['queries'], int(baseline[key] * (1 + BASELINE_TOLERANCE)),
+                    f"{result['flow']} con {result['n']} placas: {result['queries']} consultas "
+                    f"frente a {baseline[key]} en la corrida de referencia",
+                )
@@ -0,0 +1,72 @@
+import base64
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMarblePackingListImport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.product = cls.env['product.product'].create({
+            'name': 'Mármol Packing',
+            'default_code': 'MAR-PACK',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+        })
+        cls.order = cls.env['purchase.order'].create({
+            'partner_id': cls.env['res.partner'].create({'name': 'Cantera'}).id,
+        })
+        cls.Import = cls.env['marble.packing.list.import']
+
+    def test_parse_float_separators(self):
+        cases = {
+            '1.234,56': 1234.56,
+            '1,234.56': 1234.56,
+            '2,85': 2.85,
+            '2.85': 2.85,
+            '1.234.567': 1234567.0,
+            '1,234,567': 1234567.0,
+            '': 0.0,
+            3: 3.0,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertAlmostEqual(self.Import._marble_parse_float(value), expected)
+
+    def test_import_csv(self):
+        content = (
+            "Producto;Altura (m);Ancho (m);Grosor (cm);Bloque;Contenedor\n"
+            "MAR-PACK;2,80;1,60;2;B-01;CONT-9\n"
+            "MAR-PACK;1.234,5;0,5;2;B-01;CONT-9\n"
+        )
+        wizard = self.Import.create({
+            'order_id': self.order.id,
+            'file': base64.b64encode(content.encode()),
+            'filename': 'packing.csv',
+        })
+        wizard.action_import()
+        lines = self.order.order_line
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines.mapped('marble_height'), [2.8, 1234.5])
+        self.assertAlmostEqual(lines[0].marble_sqm, 4.48)
+        self.assertEqual(set(lines.mapped('lot_general')), {'B-01'})
+
+    def test_import_csv_windows_1252(self):
+        # CSV guardado por Excel en español sin elegir UTF-8
+        content = (
+            "Producto;Altura (m);Ancho (m);m²;Bloque;Número de Contenedor\n"
+            "MAR-PACK;2,80;1,60;;B-02;CONT-Ñ1\n"
+        )
+        wizard = self.Import.create({
+            'order_id': self.order.id,
+            'file': base64.b64encode(content.encode('cp1252')),
+            'filename': 'packing.csv',
+        })
+        wizard.action_import()
+        line = self.order.order_line
+        self.assertEqual(len(line), 1)
+        self.assertEqual(line.numero_contenedor, 'CONT-Ñ1')
+        self.assertAlmostEqual(line.marble_sqm, 4.48)
@@ -0,0 +1,60 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMarblePendingSync(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        cls.product = cls.env['product.product'].create({
+            'name': 'Mármol Sync',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+        })
+        cls.lot = cls.env['stock.lot'].create({
+            'name': 'SYNC-001',
+            'product_id': cls.product.id,
+            'marble_height': 2.8,
+            'marble_width': 1.6,
+            'marble_sqm': 4.48,
+            'lot_general': 'SYNC',
+            'marble_thickness': 2.0,
+        })
+        picking_type = cls.warehouse.out_type_id
+        cls.picking = cls.env['stock.picking'].create({
+            'picking_type_id': picking_type.id,
+            'location_id': picking_type.default_location_src_id.id,
+            'location_dest_id': cls.env.ref('stock.stock_location_customers').id,
+        })
+
+    def _create_unsynced_move(self):
+        # Datos de mármol distintos a los del lote: queda pendiente de sincronizar
+        return self.env['stock.move'].create({
+            'name': 'Placa desincronizada',
+            'picking_id': self.picking.id,
+            'product_id': self.product.id,
+            'product_uom_qty': 1.0,
+            'location_id': self.picking.location_id.id,
+            'location_dest_id': self.picking.location_dest_id.id,
+            'lot_id': self.lot.id,
+            'marble_height': 1.0,
+            'marble_width': 1.0,
+        })
+
+    def test_pending_moves_survive_savepoint_flush(self):
+        move = self._create_unsynced_move()
+        # Un savepoint hace flush y ejecuta los precommit del cursor
+        with self.env.cr.savepoint():
+            self.env['res.partner'].create({'name': 'Flush'})
+        self.assertEqual(self.env['stock.move']._marble_pop_pending_sync(self.picking), move)
+
+    def test_picking_write_syncs_after_savepoint(self):
+        move = self._create_unsynced_move()
+        with self.env.cr.savepoint():
+            self.env['res.partner'].create({'name': 'Flush'})
+        self.picking.write({'origin': 'SYNC'})
+        self.assertEqual(move.marble_sqm, self.lot.marble_sqm)
+        self.assertEqual(move.lot_general, 'SYNC')
@@ -0,0 +1,71 @@
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMarbleProcurementGroups(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.vendor = cls.env['res.partner'].create({'name': 'Cantera'})
+        cls.customer = cls.env['res.partner'].create({'name': 'Cliente'})
+        warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        mto_route = warehouse.mto_pull_id.route_id
+        mto_route.active = True
+        buy_route = warehouse.buy_pull_id.route_id
+        cls.product = cls.env['product.product'].create({
+            'name': 'Mármol Bajo Pedido',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+            'route_ids': [Command.set([mto_route.id, buy_route.id])],
+            'seller_ids': [Command.create({'partner_id': cls.vendor.id, 'price': 100.0})],
+        })
+
+    def _create_order(self, *heights):
+        return self.env['sale.order'].create({
+            'partner_id': self.customer.id,
+            'order_line': [Command.create({
+                'product_id': self.product.id,
+                'product_uom_qty': 1.0,
+                'marble_height': height,
+                'marble_width': 1.6,
+                'lot_general': 'BLOQUE-MTO',
+            }) for height in heights],
+        })
+
+    def _purchase_line(self, sale_line):
+        return self.env['purchase.order.line'].search([('move_dest_ids', 'in', sale_line.move_ids.ids)])
+
+    def test_marble_lines_share_the_order_group(self):
+        order = self._create_order(2.8, 3.0)
+        order.action_confirm()
+
+        # Un solo grupo, el del pedido, y una sola entrega para todas las placas
+        group = order.procurement_group_id
+        self.assertTrue(group)
+        self.assertEqual(self.env['procurement.group'].search([('sale_id', '=', order.id)]), group)
+        self.assertEqual(len(order.picking_ids), 1)
+        for line in order.order_line:
+            self.assertEqual(len(line.move_ids), 1)
+            self.assertEqual(line.move_ids.group_id, group)
+            self.assertEqual(line.move_ids.marble_height, line.marble_height)
+            # Cada placa se compra en su propia línea, con sus medidas
+            po_line = self._purchase_line(line)
+            self.assertEqual(len(po_line), 1)
+            self.assertEqual(po_line.product_qty, 1.0)
+            self.assertEqual(po_line.marble_height, line.marble_height)
+
+    def test_slab_does_not_reuse_another_slab_purchase_line(self):
+        first, second = (self._create_order(height) for height in (2.8, 3.0))
+        first.action_confirm()
+        second.action_confirm()
+
+        first_po_line = self._purchase_line(first.order_line)
+        second_po_line = self._purchase_line(second.order_line)
+        # Misma solicitud de presupuesto en borrador, líneas distintas
+        self.assertEqual(first_po_line.order_id, second_po_line.order_id)
+        self.assertNotEqual(first_po_line, second_po_line)
+        self.assertEqual((first_po_line.product_qty, first_po_line.marble_height), (1.0, 2.8))
+        self.assertEqual((second_po_line.product_qty, second_po_line.marble_height), (1.0, 3.0))
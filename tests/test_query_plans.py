@@ -0,0 +1,16 @@
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL
+
+
+@tagged('post_install', '-at_install', 'marble_query_plan')
+class TestMarbleQueryPlans(TransactionCase):
+
+    def test_main_lookups_use_indexes(self):
+        offenders = self.env['marble.query.plan']._find_unindexed_scans()
+        self.assertFalse(offenders, "Consultas sin índice utilizable: %s" % offenders)
+
+    def test_missing_index_is_reported(self):
+        # El DROP se revierte con la transacción del test
+        self.env.cr.execute(SQL("DROP INDEX stock_lot__numero_contenedor_index"))
+        offenders = dict(self.env['marble.query.plan']._find_unindexed_scans())
+        self.assertEqual(offenders.get('Lotes por contenedor'), ['stock_lot'])
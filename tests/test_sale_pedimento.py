@@ -0,0 +1,56 @@
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMarbleSalePedimento(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        cls.product = cls.env['product.product'].create({
+            'name': 'Mármol Pedimento',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'serial',
+        })
+        cls.lot = cls.env['stock.lot'].create({'name': 'PED-001', 'product_id': cls.product.id})
+        cls.customer = cls.env['res.partner'].create({'name': 'Cliente Pedimento'})
+
+    def _add_stock(self, location, quantity):
+        self.env['stock.quant']._update_available_quantity(self.product, location, quantity, lot_id=self.lot)
+        return self.env['stock.quant'].search([('lot_id', '=', self.lot.id), ('location_id', '=', location.id)])
+
+    def _create_line(self):
+        order = self.env['sale.order'].create({
+            'partner_id': self.customer.id,
+            'order_line': [Command.create({
+                'product_id': self.product.id,
+                'product_uom_qty': 1.0,
+                'lot_id': self.lot.id,
+            })],
+        })
+        return order.order_line
+
+    def test_pedimento_kept_after_stock_leaves(self):
+        stock = self.warehouse.lot_stock_id
+        self._add_stock(stock, 1.0).pedimento_number = '24 47 3807 4000123'
+        line = self._create_line()
+        self.assertEqual(line.pedimento_number, '24 47 3807 4000123')
+
+        # La placa sale del almacén: el lote pierde el pedimento, la línea no
+        self._add_stock(stock, -1.0)
+        self.env.flush_all()
+        self.assertEqual(self.lot.pedimento_number, '')
+        self.assertEqual(line.pedimento_number, '24 47 3807 4000123')
+
+    def test_pedimento_from_transit_stock(self):
+        transit = self.env['stock.location'].create({
+            'name': 'Tránsito Pedimento',
+            'usage': 'transit',
+            'location_id': self.warehouse.view_location_id.id,
+        })
+        self._add_stock(transit, 1.0).pedimento_number = '24 47 3807 4000456'
+        line = self._create_line()
+        self.assertEqual(line.pedimento_number, '24 47 3807 4000456')
@@ -0,0 +1,4 @@
+from . import marble_slab_search
+from . import marble_packing_list_import
+from . import marble_container_receipt
+from . import marble_price_level
@@ -0,0 +1,196 @@
+# wizard/marble_container_receipt.py
+
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import float_compare
+
+# Campos de mármol que el asistente edita por pieza
+RECEIPT_MARBLE_FIELDS = (
+    'marble_height', 'marble_width', 'marble_thickness', 'lot_general', 'numero_contenedor',
+)
+
+
+class MarbleContainerReceipt(models.TransientModel):
+    _name = 'marble.container.receipt'
+    _description = 'Recepción de Contenedor'
+
+    picking_id = fields.Many2one('stock.picking', 'Recepción', required=True, ondelete='cascade')
+    numero_contenedor = fields.Char(
+        'Número de Contenedor',
+        help="Si se indica, solo se cargan las piezas de este contenedor.",
+    )
+    line_ids = fields.One2many('marble.container.receipt.line', 'wizard_id', 'Piezas')
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        picking = self.env['stock.picking'].browse(res.get('picking_id'))
+        if picking and 'line_ids' in fields_list:
+            res['line_ids'] = self._marble_prepare_lines(picking)
+        return res
+
+    @api.model
+    def _marble_pending_quantities(self, moves):
+        """
+        {move_id: cantidad aún por recibir}: la demanda menos lo ya confirmado
+        (líneas de operación con lote y marcadas como recogidas).
+        """
+        pending = {}
+        for move in moves:
+            received = sum(
+                line.product_uom_id._compute_quantity(line.quantity, move.product_uom)
+                for line in move.move_line_ids
+                if line.lot_id and line.picked
+            )
+            pending[move.id] = move.product_uom_qty - received
+        return pending
+
+    @api.model
+    def _marble_prepare_lines(self, picking, numero_contenedor=False):
+        """Una fila por movimiento con cantidad pendiente, con los datos de mármol de la compra."""
+        moves = picking.move_ids_without_package.filtered(lambda m: m.state not in ('done', 'cancel'))
+        moves.fetch(['product_id', 'product_uom_qty', 'product_uom'] + list(RECEIPT_MARBLE_FIELDS))
+        if numero_contenedor:
+            moves = moves.filtered(lambda m: m.numero_contenedor == numero_contenedor)
+        pending = self._marble_pending_quantities(moves)
+        return [fields.Command.create({
+            'move_id': move.id,
+            'quantity': pending[move.id],
+            **{field: move[field] for field in RECEIPT_MARBLE_FIELDS},
+        }) for move in moves if float_compare(pending[move.id], 0, precision_rounding=move.product_uom.rounding) > 0]
+
+    def action_load_moves(self):
+        """Recarga la cuadrícula desde la compra (filtrando por contenedor si se indicó)."""
+        self.ensure_one()
+        self.line_ids = [fields.Command.clear()] + self._marble_prepare_lines(self.picking_id, self.numero_contenedor)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_confirm(self):
+        """
+        Recibe todo el contenedor en una sola operación:
+        1. Comprueba que ninguna fila supere lo que queda por recibir.
+        2. Reutiliza la línea de operación con lote ya generada (al reservar)
+           para cada movimiento si es del mismo bloque; descarta las demás
+           líneas no confirmadas y los lotes que solo ellas usaban.
+        3. Lleva a los movimientos las correcciones de la cuadrícula (un write por payload).
+        4. Ajusta cantidades y datos de mármol de las líneas y lotes reutilizados
+           y crea las que faltan con un único create; sus números de serie y
+           lotes se generan en bloque (StockMoveLine._marble_generate_lots).
+        5. Marca las cantidades de los movimientos como confirmadas.
+        Así, volver a ejecutar el asistente no duplica líneas ni lotes.
+        """
+        self.ensure_one()
+        rows = self.line_ids.filtered(lambda r: r.quantity > 0)
+        if not rows:
+            raise UserError(_("No hay piezas que recibir."))
+        invalid = rows.filtered(lambda r: not r.lot_general or r.marble_height <= 0 or r.marble_width <= 0)
+        if invalid:
+            raise UserError(_(
+                "Todas las piezas necesitan lote, altura y ancho. Revise: %s"
+            ) % ', '.join(invalid.move_id.mapped('display_name')[:10]))
+
+        moves = rows.move_id
+        pending = self._marble_pending_quantities(moves)
+        received = rows.filtered(lambda r: float_compare(
+            r.quantity, pending[r.move_id.id], precision_rounding=r.move_id.product_uom.rounding,
+        ) > 0)
+        if received:
+            raise UserError(_(
+                "Estas piezas ya se recibieron o superan lo pendiente: %s"
+            ) % ', '.join(received.move_id.mapped('display_name')[:10]))
+
+        row_by_move = {row.move_id.id: row for row in rows}
+        unconfirmed = moves.move_line_ids.filtered(lambda l: not l.picked)
+        reused = {}  # {move_id: stock.move.line}
+        for line in unconfirmed.filtered('lot_id'):
+            if line.move_id.id not in reused and line.lot_id.lot_general == row_by_move[line.move_id.id].lot_general:
+                reused[line.move_id.id] = line
+        reused_lines = self.env['stock.move.line'].union(*reused.values())
+        discarded = unconfirmed - reused_lines
+        stale_lots = discarded.lot_id
+        discarded.unlink()
+        if stale_lots:
+            [[referenced]] = self.env['stock.move.line']._read_group(
+                [('lot_id', 'in', stale_lots.ids)], aggregates=['lot_id:recordset'],
+            )
+            (stale_lots - referenced).filtered(lambda lot: not lot.quant_ids).unlink()
+
+        move_ids_by_payload = defaultdict(list)
+        for row in rows:
+            payload = tuple((field, row[field] or False) for field in RECEIPT_MARBLE_FIELDS)
+            if any((row.move_id[field] or False) != value for field, value in payload):
+                move_ids_by_payload[payload].append(row.move_id.id)
+        Move = self.env['stock.move'].with_context(skip_sync=True)
+        for payload, move_ids in move_ids_by_payload.items():
+            Move.browse(move_ids).write(dict(payload))
+
+        # Líneas reutilizadas: cantidad y datos de su lote, agrupados por payload
+        line_ids_by_qty = defaultdict(list)
+        lot_ids_by_payload = defaultdict(list)
+        for move_id, line in reused.items():
+            row = row_by_move[move_id]
+            line_ids_by_qty[row.quantity].append(line.id)
+            lot_payload = (
+                ('marble_height', row.marble_height),
+                ('marble_width', row.marble_width),
+                ('marble_sqm', row.marble_sqm),
+                ('marble_thickness', row.marble_thickness),
+                ('numero_contenedor', row.numero_contenedor or False),
+            )
+            if any((line.lot_id[field] or False) != (value or False) for field, value in lot_payload):
+                lot_ids_by_payload[lot_payload].append(line.lot_id.id)
+        MoveLine = self.env['stock.move.line']
+        for quantity, line_ids in line_ids_by_qty.items():
+            MoveLine.browse(line_ids).write({'quantity': quantity})
+        for payload, lot_ids in lot_ids_by_payload.items():
+            self.env['stock.lot'].browse(lot_ids).write(dict(payload))
+
+        vals_list = []
+        for row in rows.filtered(lambda r: r.move_id.id not in reused):
+            vals = row.move_id._prepare_move_line_vals(quantity=row.quantity)
+            vals.update({field: row[field] for field in RECEIPT_MARBLE_FIELDS})
+            vals['marble_sqm'] = row.marble_sqm
+            vals_list.append(vals)
+        MoveLine.create(vals_list)
+
+        moves.picked = True
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'stock.picking',
+            'res_id': self.picking_id.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def action_confirm_and_validate(self):
+        self.action_confirm()
+        return self.picking_id.button_validate()
+
+
+class MarbleContainerReceiptLine(models.TransientModel):
+    _name = 'marble.container.receipt.line'
+    _description = 'Pieza de Recepción de Contenedor'
+
+    wizard_id = fields.Many2one('marble.container.receipt', required=True, ondelete='cascade')
+    move_id = fields.Many2one('stock.move', 'Movimiento', required=True, ondelete='cascade')
+    product_id = fields.Many2one(related='move_id.product_id')
+    quantity = fields.Float('Cantidad', digits='Product Unit of Measure')
+    marble_height = fields.Float('Altura (m)')
+    marble_width = fields.Float('Ancho (m)')
+    marble_sqm = fields.Float('m²', compute='_compute_marble_sqm')
+    marble_thickness = fields.Float('Grosor (cm)')
+    lot_general = fields.Char('Lote')
+    numero_contenedor = fields.Char('Número de Contenedor')
+
+    @api.depends('marble_height', 'marble_width')
+    def _compute_marble_sqm(self):
+        for line in self:
+            line.marble_sqm = (line.marble_height or 0.0) * (line.marble_width or 0.0)
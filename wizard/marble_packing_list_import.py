@@ -0,0 +1,268 @@
+# wizard/marble_packing_list_import.py
+
+import base64
+import csv
+import io
+import unicodedata
+from itertools import islice
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+# Filas por lote de creación de líneas de compra
+IMPORT_BATCH_SIZE = 500
+# Errores que se muestran al usuario (el resto solo se cuentan)
+MAX_REPORTED_ERRORS = 20
+
+# Encabezados aceptados (normalizados: minúsculas, sin acentos ni espacios extra)
+COLUMN_ALIASES = {
+    'product':           ('producto', 'product', 'referencia', 'codigo', 'default_code', 'sku'),
+    'product_qty':       ('cantidad', 'qty', 'quantity', 'piezas'),
+    'marble_height':     ('altura', 'alto', 'height', 'largo', 'length'),
+    'marble_width':      ('ancho', 'width'),
+    'marble_sqm':        ('m2', 'sqm', 'area', 'superficie'),
+    'marble_thickness':  ('grosor', 'espesor', 'thickness'),
+    'lot_general':       ('lote', 'bloque', 'block', 'lot', 'lot_general'),
+    'numero_contenedor': ('contenedor', 'container', 'numero_contenedor', 'numero_de_contenedor'),
+}
+FLOAT_COLUMNS = ('product_qty', 'marble_height', 'marble_width', 'marble_sqm', 'marble_thickness')
+
+
+def _normalize_header(value):
+    """'Número de Contenedor' -> 'numero_de_contenedor'; 'Altura (m)' -> 'altura'."""
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(text.split('(')[0].lower().split())
+
+
+class MarblePackingListImport(models.TransientModel):
+    _name = 'marble.packing.list.import'
+    _description = 'Importación de Packing List'
+
+    order_id = fields.Many2one('purchase.order', 'Orden de Compra', required=True, ondelete='cascade')
+    product_id = fields.Many2one(
+        'product.product', 'Producto por Defecto',
+        help="Producto de las filas que no indican producto en el archivo.",
+    )
+    file = fields.Binary('Archivo', required=True)
+    filename = fields.Char('Nombre del Archivo')
+
+    # ---------------------------------------------------------------------
+    # Lectura del archivo
+    # ---------------------------------------------------------------------
+    def _marble_iter_rows(self):
+        """
+        Recorre las filas del archivo (CSV o XLSX) una a una, sin construir la
+        tabla completa. Devuelve (número de fila, {columna: valor}).
+        """
+        self.ensure_one()
+        content = io.BytesIO(base64.b64decode(self.file))
+        if (self.filename or '').lower().endswith(('.xlsx', '.xlsm')):
+            rows = self._marble_iter_xlsx(content)
+        else:
+            rows = self._marble_iter_csv(content)
+
+        header = next(rows, None)
+        if not header:
+            raise UserError(_("El archivo está vacío."))
+        columns = {}
+        for index, title in enumerate(header):
+            name = _normalize_header(title)
+            for column, aliases in COLUMN_ALIASES.items():
+                if (name in aliases or name.split('_')[0] in aliases) and column not in columns:
+                    columns[column] = index
+        if not {'marble_height', 'marble_width'} <= columns.keys() and 'marble_sqm' not in columns:
+            raise UserError(_("El archivo debe tener columnas de altura y ancho, o de m²."))
+
+        for row_number, row in enumerate(rows, start=2):
+            if not any(cell not in (None, '') for cell in row):
+                continue
+            yield row_number, {
+                column: row[index] if index < len(row) else None
+                for column, index in columns.items()
+            }
+
+    @api.model
+    def _marble_iter_csv(self, content):
+        # Excel guarda los CSV en Windows-1252 salvo que se elija "CSV UTF-8"
+        try:
+            content.getvalue().decode('utf-8-sig')
+            encoding = 'utf-8-sig'
+        except UnicodeDecodeError:
+            encoding = 'cp1252'
+        stream = io.TextIOWrapper(content, encoding=encoding, newline='')
+        try:
+            # El separador se decide por el encabezado: en los datos la coma
+            # puede ser el separador decimal ("2,80;1,60")
+            header = stream.readline()
+            stream.seek(0)
+            delimiter = max(';\t,', key=header.count) if header else ','
+            yield from csv.reader(stream, delimiter=delimiter)
+        except UnicodeDecodeError:
+            raise UserError(_("No se pudo leer la codificación del archivo. Guárdelo como CSV UTF-8."))
+
+    @api.model
+    def _marble_iter_xlsx(self, content):
+        if load_workbook is None:
+            raise UserError(_("La importación de archivos XLSX requiere la librería Python 'openpyxl'."))
+        workbook = load_workbook(content, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    # ---------------------------------------------------------------------
+    # Validación
+    # ---------------------------------------------------------------------
+    @api.model
+    def _marble_parse_float(self, value):
+        """
+        Número de una celda: "1.234,56" y "1,234.56" -> 1234.56. Con ambos
+        separadores, el último que aparece es el decimal; con uno solo, es
+        decimal salvo que se repita ("1.234.567").
+        """
+        if value in (None, ''):
+            return 0.0
+        if isinstance(value, (int, float)):
+            return float(value)
+        text = str(value).strip().replace(' ', '').replace('\xa0', '')
+        if ',' in text and '.' in text:
+            decimal = ',' if text.rindex(',') > text.rindex('.') else '.'
+        elif text.count(',') == 1:
+            decimal = ','
+        elif text.count('.') == 1:
+            decimal = '.'
+        else:
+            decimal = None
+        thousands = {',', '.'} - {decimal}
+        for separator in thousands:
+            text = text.replace(separator, '')
+        if decimal == ',':
+            text = text.replace(',', '.')
+        return float(text)
+
+    def _marble_prepare_line(self, row):
+        """
+        Valores de la línea de compra de una fila, con las mismas reglas que
+        _compute_marble_sqm: con altura y ancho los m² se calculan; sin ellos
+        se conservan los m² indicados. Devuelve (vals, código de producto).
+        """
+        values = {}
+        for column in FLOAT_COLUMNS:
+            try:
+                values[column] = self._marble_parse_float(row.get(column))
+            except ValueError:
+                raise UserError(_("Valor numérico inválido en '%s': %s") % (column, row.get(column)))
+            if values[column] < 0:
+                raise UserError(_("'%s' no puede ser negativo.") % column)
+
+        height, width = values['marble_height'], values['marble_width']
+        if bool(height) != bool(width):
+            raise UserError(_("Se requieren altura y ancho juntos."))
+        if height and width:
+            values['marble_sqm'] = height * width
+        elif not values['marble_sqm']:
+            raise UserError(_("La fila no tiene dimensiones ni m²."))
+
+        vals = {
+            'order_id': self.order_id.id,
+            'product_qty': values['product_qty'] or 1.0,
+            'marble_height': height,
+            'marble_width': width,
+            'marble_sqm': values['marble_sqm'],
+            'marble_thickness': values['marble_thickness'],
+            'lot_general': self._marble_parse_text(row.get('lot_general')),
+            'numero_contenedor': self._marble_parse_text(row.get('numero_contenedor')),
+        }
+        return vals, self._marble_parse_text(row.get('product'))
+
+    @api.model
+    def _marble_parse_text(self, value):
+        # Las celdas numéricas de XLSX llegan como float: 1024.0 -> '1024'
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value if value is not None else '').strip()
+
+    def _marble_resolve_products(self, codes):
+        """Productos por referencia interna (o nombre) con una sola búsqueda."""
+        if not codes:
+            return {}
+        products = self.env['product.product'].search_fetch(
+            ['|', ('default_code', 'in', list(codes)), ('name', 'in', list(codes))],
+            ['default_code', 'name'],
+        )
+        by_code = {}
+        for product in products:
+            by_code.setdefault(product.name, product.id)
+        for product in products:
+            if product.default_code:
+                by_code[product.default_code] = product.id
+        return by_code
+
+    # ---------------------------------------------------------------------
+    # Importación
+    # ---------------------------------------------------------------------
+    def action_import(self):
+        """
+        Importa el packing list por lotes de IMPORT_BATCH_SIZE filas: cada lote
+        se valida, resuelve sus productos con una búsqueda y crea sus líneas
+        con un único create. Si alguna fila es inválida no se importa nada y
+        se informa de las filas con error.
+        """
+        self.ensure_one()
+        if self.order_id.state not in ('draft', 'sent'):
+            raise UserError(_("Solo se pueden importar líneas en solicitudes de presupuesto."))
+
+        PurchaseLine = self.env['purchase.order.line']
+        errors = []
+        error_count = 0
+        imported = 0
+        rows = self._marble_iter_rows()
+        while batch := list(islice(rows, IMPORT_BATCH_SIZE)):
+            prepared = []
+            for row_number, row in batch:
+                try:
+                    prepared.append((row_number, *self._marble_prepare_line(row)))
+                except UserError as e:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(_("Fila %(row)s: %(error)s", row=row_number, error=e.args[0]))
+
+            product_by_code = self._marble_resolve_products({code for __, __, code in prepared if code})
+            vals_list = []
+            for row_number, vals, code in prepared:
+                product_id = product_by_code.get(code) if code else self.product_id.id
+                if not product_id:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(_("Fila %(row)s: producto '%(code)s' no encontrado.",
+                                        row=row_number, code=code or '-'))
+                    continue
+                vals_list.append(dict(vals, product_id=product_id))
+
+            # Tras el primer error solo se sigue validando, no se crean líneas
+            if vals_list and not error_count:
+                PurchaseLine.create(vals_list)
+                imported += len(vals_list)
+                # Liberar la caché del lote ya creado
+                self.env.invalidate_all()
+
+        if error_count:
+            if error_count > len(errors):
+                errors.append(_("... y %s filas más con errores.") % (error_count - len(errors)))
+            raise UserError(_("No se importó el packing list:\n%s") % '\n'.join(errors))
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Packing list importado'),
+                'message': _("Se crearon %s líneas de compra.") % imported,
+                'type': 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
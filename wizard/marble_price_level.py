@@ -0,0 +1,43 @@
+# wizard/marble_price_level.py
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class MarblePriceLevel(models.TransientModel):
+    _name = 'marble.price.level'
+    _description = 'Aplicar Nivel de Precio'
+
+    order_ids = fields.Many2many('sale.order', string='Cotizaciones')
+    price_level = fields.Selection(
+        [
+            ('max', 'Precio Máximo'),
+            ('avg', 'Precio Promedio'),
+            ('min', 'Precio Mínimo'),
+        ],
+        string='Nivel de Precio',
+        required=True,
+        default='max',
+    )
+    include_manual = fields.Boolean(
+        'Incluir líneas en modo manual',
+        help="Si se marca, las líneas con precio manual también pasan al nivel elegido.",
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if 'order_ids' in fields_list and self.env.context.get('active_model') == 'sale.order':
+            res['order_ids'] = [fields.Command.set(self.env.context.get('active_ids', []))]
+        return res
+
+    def action_apply(self):
+        self.ensure_one()
+        orders = self.order_ids.filtered(lambda o: o.state in ('draft', 'sent'))
+        if not orders:
+            raise UserError(_("Solo se puede cambiar el nivel de precio de cotizaciones."))
+        lines = orders.order_line.filtered(lambda l: not l.display_type)
+        if not self.include_manual:
+            lines = lines.filtered(lambda l: l.price_level != 'manual')
+        lines._marble_apply_price_level(self.price_level)
+        return {'type': 'ir.actions.client', 'tag': 'soft_reload'}
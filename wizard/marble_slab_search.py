@@ -0,0 +1,28 @@
+# wizard/marble_slab_search.py
+
+from odoo import models, fields
+
+
+class MarbleSlabSearch(models.TransientModel):
+    _name = 'marble.slab.search'
+    _description = 'Búsqueda de Placas por Medidas'
+
+    product_id = fields.Many2one('product.product', 'Producto', required=True)
+    marble_thickness = fields.Float('Grosor (cm)')
+    min_height = fields.Float('Altura Mínima (m)')
+    min_width = fields.Float('Ancho Mínimo (m)')
+
+    def action_search(self):
+        self.ensure_one()
+        domain = self.env['stock.lot']._marble_slab_domain(
+            self.product_id.id, self.marble_thickness, self.min_height, self.min_width,
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f"Placas de {self.product_id.display_name}",
+            'res_model': 'stock.lot',
+            'view_mode': 'list,form',
+            'views': [(self.env.ref('marble_serial_tracking.view_stock_lot_slab_list').id, 'list'), (False, 'form')],
+            'domain': domain,
+            'context': {'create': False},
+        }